@@ -2,18 +2,216 @@
 Authentication module for Cpolar Connect
 """
 
+import functools
 import logging
-from typing import Optional, Tuple
-
-import requests
-from bs4 import BeautifulSoup
+import re
+from typing import TYPE_CHECKING, Optional, Tuple
 
 from .config import ConfigManager
 from .exceptions import AuthenticationError, NetworkError
 from .i18n import _
 
+if TYPE_CHECKING:
+    import requests
+
 logger = logging.getLogger(__name__)
 
+# Browser-like User-Agent sent with every dashboard request
+_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# Fast path for the login form's hidden input; values with quotes or entities
+# are left to the full parser
+_CSRF_INPUT_RE = re.compile(rb"<input\s[^>]*?\bname=[\"']csrf_token[\"'][^>]*>", re.I)
+_VALUE_ATTR_RE = re.compile(rb"\svalue=[\"']([^\"'&]*)[\"']", re.I)
+
+# Status page indicators; case-insensitive so the body is not lowercased
+_LOGGED_IN_RE = re.compile("logout|status|tunnel|隧道", re.I)
+_LOGIN_FORM_RE = re.compile("password|login|sign in", re.I)
+
+
+# Failure indicators (based on actual cpolar responses)
+_LOGIN_FAILURE_PHRASES = (
+    "not valid",  # "The email or password you entered is not valid."
+    "login failed",
+    "invalid credentials",
+    "incorrect password",
+    "authentication failed",
+    "登录失败",
+    "密码错误",
+    "无效",
+)
+_LOGIN_SUCCESS_PHRASES = ("logout", "status", "dashboard", "tunnel", "隧道")
+
+# Both phrase sets in one case-insensitive alternation; the named group that
+# matched tells which kind of phrase was found, so the body is scanned once
+_LOGIN_RESULT_RE = re.compile(
+    "(?P<failure>{})|(?P<success>{})".format(
+        "|".join(map(re.escape, _LOGIN_FAILURE_PHRASES)),
+        "|".join(map(re.escape, _LOGIN_SUCCESS_PHRASES)),
+    ),
+    re.IGNORECASE,
+)
+
+
+def _login_result_from_url(url: str) -> Optional[bool]:
+    """
+    Judge a login attempt from the page it lands on.
+
+    Only the path is inspected: the dashboard host name itself contains
+    "/dashboard" when matched against the full URL.
+
+    Returns:
+        True/False when the path is conclusive, None otherwise
+    """
+    from urllib.parse import urlsplit
+
+    path = urlsplit(url).path
+    if "/login" in path:
+        return False
+    if path.startswith(("/status", "/dashboard", "/get-started")):
+        return True
+    return None
+
+
+def _scan_login_result(response: "requests.Response") -> bool:
+    """
+    Scan a streamed login response body for result phrases.
+
+    Stops reading at the first failure phrase. A short tail of each chunk is
+    carried over so phrases split across chunk boundaries still match.
+    """
+    if response.encoding is None:
+        response.encoding = "utf-8"
+
+    succeeded = False
+    tail = ""
+    for chunk in response.iter_content(chunk_size=16384, decode_unicode=True):
+        window = tail + chunk
+        for match in _LOGIN_RESULT_RE.finditer(window):
+            if match.lastgroup == "failure":
+                return False
+            succeeded = True
+        tail = window[-64:]
+    return succeeded
+
+
+def login_succeeded(session: "requests.Session", response: "requests.Response") -> bool:
+    """
+    Judge a login POST sent with allow_redirects=False.
+
+    A redirect is judged by its target before anything is fetched; only a
+    redirect that is not conclusive (e.g. "/", which may lead on to /login)
+    is followed. A page whose URL settles nothing is scanned for result
+    phrases.
+
+    Args:
+        session: Session the login was posted with
+        response: The (preferably streamed) login POST response
+
+    Returns:
+        True if the login succeeded
+    """
+    from urllib.parse import urljoin
+
+    target = response.url
+    if response.is_redirect:
+        target = urljoin(response.url, response.headers["Location"])
+        logger.debug(f"Login redirected to: {target}")
+
+    result = _login_result_from_url(target)
+    if result is not None:
+        return result
+    if not response.is_redirect:
+        return _scan_login_result(response)
+
+    # Inconclusive redirect: follow it and inspect the landing page
+    with session.get(target, timeout=10, stream=True) as landing:
+        result = _login_result_from_url(landing.url)
+        if result is not None:
+            return result
+        return _scan_login_result(landing)
+
+
+@functools.lru_cache(maxsize=None)
+def _csrf_xpaths():
+    """Compile the CSRF input and meta tag XPaths on first use"""
+    from lxml import etree
+
+    return (
+        etree.XPath('//input[@name="csrf_token"]'),
+        etree.XPath('//meta[@name="csrf-token"]'),
+    )
+
+
+def extract_csrf_token(content: bytes) -> Optional[str]:
+    """
+    Extract the CSRF token from login page HTML
+
+    Args:
+        content: Raw login page body
+
+    Returns:
+        Token from the csrf_token input (or csrf-token meta tag as a
+        fallback), or None if the page carries neither
+    """
+    tag = _CSRF_INPUT_RE.search(content)
+    if tag:
+        value = _VALUE_ATTR_RE.search(tag.group(0))
+        if value:
+            return value.group(1).decode("utf-8", "replace")
+
+    from lxml import etree
+    from lxml import html as lxml_html
+
+    input_xpath, meta_xpath = _csrf_xpaths()
+    try:
+        root = lxml_html.fromstring(content)
+    except etree.ParserError:
+        # Empty or whitespace-only page ("Document is empty")
+        return None
+
+    csrf_inputs = input_xpath(root)
+    if csrf_inputs:
+        return csrf_inputs[0].get("value", "")
+
+    # Sometimes the token might be in meta tag
+    meta_csrf = meta_xpath(root)
+    if meta_csrf:
+        return meta_csrf[0].get("content", "")
+
+    return None
+
+
+def create_session() -> "requests.Session":
+    """
+    Create a requests session for the cpolar dashboard
+
+    The session keeps TLS connections alive between requests and retries
+    idempotent requests on transient gateway errors.
+
+    Returns:
+        Configured requests.Session object
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.request import ACCEPT_ENCODING
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    session.mount("https://", adapter)
+    session.headers.update(
+        {
+            "User-Agent": _USER_AGENT,
+            "Connection": "keep-alive",
+            # Every encoding urllib3 can decode here: gzip and deflate,
+            # plus br/zstd when the brotli extra (or zstandard) is installed
+            "Accept-Encoding": ACCEPT_ENCODING,
+        }
+    )
+    return session
+
 
 class CpolarAuth:
     """Handle cpolar authentication"""
@@ -22,12 +220,10 @@ class CpolarAuth:
         """Initialize authentication with config manager"""
         self.config_manager = config_manager
         self.config = config_manager.get_config()
-        self.session = requests.Session()
-        self.session.headers.update(
-            {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-        )
+
+        # One session for the whole run: login, status and auth pages all hit
+        # the same host, so keep the TLS connection warm between requests
+        self.session = create_session()
         self.base_url = self.config.base_url
         self.login_url = f"{self.base_url}/login"
         self.status_url = f"{self.base_url}/status"
@@ -35,24 +231,17 @@ class CpolarAuth:
 
     def get_csrf_token(self) -> str:
         """Get CSRF token from login page"""
+        import requests
+
         try:
             response = self.session.get(self.login_url, timeout=10)
             response.raise_for_status()
 
-            soup = BeautifulSoup(response.text, "html.parser")
-            csrf_input = soup.find("input", {"name": "csrf_token"})
-
-            if not csrf_input:
-                # Try alternative methods
-                # Sometimes the token might be in meta tag
-                meta_csrf = soup.find("meta", {"name": "csrf-token"})
-                if meta_csrf:
-                    return meta_csrf.get("content", "")
-
+            csrf_token = extract_csrf_token(response.content)
+            if csrf_token is None:
                 logger.error("CSRF token not found in login page")
                 raise AuthenticationError(_("error.csrf_token_not_found"))
 
-            csrf_token = csrf_input.get("value", "")
             if not csrf_token:
                 raise AuthenticationError(_("error.csrf_token_empty"))
 
@@ -68,7 +257,7 @@ class CpolarAuth:
 
     def login(
         self, username: Optional[str] = None, password: Optional[str] = None
-    ) -> requests.Session:
+    ) -> "requests.Session":
         """
         Login to cpolar and return authenticated session
 
@@ -88,6 +277,8 @@ class CpolarAuth:
             if not password:
                 raise AuthenticationError(_("auth.password_required"))
 
+        import requests
+
         try:
             # Step 1: Get CSRF token
             csrf_token = self.get_csrf_token()
@@ -104,35 +295,24 @@ class CpolarAuth:
             logger.debug(f"Login form fields: {list(login_data.keys())}")
             logger.debug(f"Login URL: {self.login_url}")
 
-            response = self.session.post(
+            # A successful login redirects to the dashboard. The session
+            # cookie is already stored from this response, so a conclusive
+            # redirect target is not fetched; the next request goes straight
+            # to the page that is actually needed.
+            with self.session.post(
                 self.login_url,
                 data=login_data,
                 timeout=10,
                 allow_redirects=False,  # Handle redirects manually
-            )
+                stream=True,
+            ) as response:
+                if not response.is_redirect:
+                    response.raise_for_status()
 
-            # Check for redirect (successful login typically redirects)
-            if response.status_code in [302, 303]:
-                redirect_url = response.headers.get("Location", "")
-                logger.debug(f"Login redirected to: {redirect_url}")
-
-                # Follow the redirect
-                response = self.session.get(
-                    (
-                        redirect_url
-                        if redirect_url.startswith("http")
-                        else f"{self.base_url}{redirect_url}"
-                    ),
-                    timeout=10,
-                )
-                response.raise_for_status()
-            else:
-                response.raise_for_status()
-
-            # Step 3: Verify login success
-            if not self._verify_authentication(response):
-                logger.error("Login verification failed")
-                raise AuthenticationError(_("auth.login_failed"))
+                # Step 3: Verify login success
+                if not self._verify_authentication(response):
+                    logger.error("Login verification failed")
+                    raise AuthenticationError(_("auth.login_failed"))
 
             self.authenticated = True
             logger.info(f"Successfully authenticated as {username}")
@@ -148,20 +328,13 @@ class CpolarAuth:
             logger.error(f"Unexpected error during login: {e}")
             raise AuthenticationError(_("error.auth", error=e))
 
-    def _verify_authentication(self, response: requests.Response) -> bool:
+    def _verify_authentication(self, response: "requests.Response") -> bool:
         """
         Verify that authentication was successful.
 
-        Logic: Success if redirected away from /login page.
+        Same rule as the credential check in `init`: see login_succeeded.
         """
-        # Not on login page = success
-        if "/login" not in response.url:
-            logger.debug(f"Login successful, redirected to {response.url}")
-            return True
-
-        # Still on login page = failure
-        logger.debug("Still on login page after POST")
-        return False
+        return login_succeeded(self.session, response)
 
     def logout(self) -> None:
         """Logout from cpolar"""
@@ -203,19 +376,13 @@ class CpolarAuth:
                 return False
 
             # Check for authentication indicators in response
-            response_text = response.text.lower()
             if response.status_code == 200:
+                response_text = response.text
                 # Look for indicators we're logged in
-                if any(
-                    indicator in response_text
-                    for indicator in ["logout", "status", "tunnel", "隧道"]
-                ):
+                if _LOGGED_IN_RE.search(response_text):
                     return True
                 # If we see login form elements, we're not authenticated
-                if any(
-                    indicator in response_text
-                    for indicator in ["password", "login", "sign in"]
-                ):
+                if _LOGIN_FORM_RE.search(response_text):
                     self.authenticated = False
                     return False
 
@@ -225,7 +392,7 @@ class CpolarAuth:
             self.authenticated = False
             return False
 
-    def get_session(self) -> requests.Session:
+    def get_session(self) -> "requests.Session":
         """Get the current session, login if necessary"""
         if not self.is_authenticated():
             self.login()
@@ -3,64 +3,105 @@
 Cpolar Connect - CLI Entry Point
 """
 
+import functools
 import json
 import logging
 import os
+import re
 import sys
 from getpass import getpass
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+from logging.handlers import MemoryHandler, RotatingFileHandler
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
 
 import click
-from rich.console import Console
-from rich.panel import Panel
-from rich.prompt import Confirm, Prompt
 
 from . import __version__
-from .auth import CpolarAuth
-from .config import ConfigError, ConfigManager
+from .config import ConfigError, ConfigManager, expand_path
 from .exceptions import AuthenticationError, NetworkError, SSHError, TunnelError
 from .i18n import Language, _, get_i18n
-from .prompts import Prompts
-from .ssh import SSHManager
-from .tunnel import TunnelManager
-
-console = Console()
-
-
-def _display_width(text: str) -> int:
-    """Calculate display width considering CJK characters"""
-    width = 0
-    for char in text:
-        # CJK Unified Ideographs range
-        if "\u4e00" <= char <= "\u9fff":
-            width += 2
-        # CJK Extension A
-        elif "\u3400" <= char <= "\u4dbf":
-            width += 2
-        # Fullwidth ASCII variants
-        elif "\uff00" <= char <= "\uffef":
-            width += 2
-        else:
-            width += 1
-    return width
+from .prompts import Prompts, create_console, display_width
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    import requests
+    from rich.console import Console
+    from rich.table import Table
+
+    from .ssh import SSHManager
+
+try:
+    import orjson
+
+    def _json_dumps(data: Any) -> str:
+        """Serialize --format json output (orjson fast path)"""
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
 
+except ImportError:
 
+    def _json_dumps(data: Any) -> str:
+        """Serialize --format json output"""
+        # Same text as orjson produces: two-space indent, non-ASCII kept
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_console() -> "Console":
+    """Create the shared rich console on first use"""
+    return create_console()
+
+
+@functools.lru_cache(maxsize=512)
 def _pad_label(label: str, target_width: int) -> str:
     """Pad label to target display width"""
-    current_width = _display_width(label)
+    current_width = display_width(label)
     padding = target_width - current_width
     return label + " " * max(0, padding)
 
 
+@functools.lru_cache(maxsize=64)
+def _labels_max_width(labels: Tuple[str, ...]) -> int:
+    """Widest display width among a group of aligned labels"""
+    return max(display_width(label) for label in labels)
+
+
+def _key_value_table(
+    key_header: str, value_header: str, key_width: int, title: Optional[str] = None
+) -> "Table":
+    """Create the two-column setting/value table used by config show and status"""
+    from rich.table import Table
+
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    table.add_column(key_header, style="cyan", width=key_width)
+    table.add_column(value_header, style="white")
+    return table
+
+
+# Comma-separated port list, e.g. "8888, 6666"
+_PORTS_RE = re.compile(r"\s*\d{1,5}(?:\s*,\s*\d{1,5})*\s*")
+
+
+def _parse_ports(text: str) -> Optional[List[int]]:
+    """Parse a comma-separated port list; None if malformed or out of range"""
+    if not _PORTS_RE.fullmatch(text):
+        return None
+    ports = [int(pt) for pt in text.split(",")]
+    if not all(1 <= pt <= 65535 for pt in ports):
+        return None
+    return ports
+
+
+_LOGGING_CONFIGURED = False
+
+
 def _setup_logging(config_manager: ConfigManager):
     """Configure rotating file logging under ~/.cpolar_connect/logs.
 
     Priority for level: env CPOLAR_LOG_LEVEL > config.log_level > INFO
     """
     # Avoid duplicate handlers if CLI is re-entered
-    root = logging.getLogger()
-    if any(isinstance(h, RotatingFileHandler) for h in root.handlers):
+    global _LOGGING_CONFIGURED
+    if _LOGGING_CONFIGURED:
         return
 
     level_name = os.environ.get("CPOLAR_LOG_LEVEL")
@@ -83,8 +124,44 @@ def _setup_logging(config_manager: ConfigManager):
         datefmt="%Y-%m-%d %H:%M:%S",
     )
     handler.setFormatter(fmt)
+    # Buffer records and write them in one go; errors are written through
+    # immediately, and logging's own exit hook flushes the rest
+    buffered = MemoryHandler(1000, flushLevel=logging.ERROR, target=handler)
+    root = logging.getLogger()
     root.setLevel(level)
-    root.addHandler(handler)
+    root.addHandler(buffered)
+    _LOGGING_CONFIGURED = True
+
+
+@functools.lru_cache(maxsize=None)
+def _get_verify_session() -> "requests.Session":
+    """Session shared by credential checks, so retries reuse the connection"""
+    from .auth import create_session
+
+    return create_session()
+
+
+def _discard_background_key(
+    p: Prompts, ssh_manager: "SSHManager", key_future: "Future[bool]"
+) -> None:
+    """
+    Wait for a cancelled background key generation and remove its key pair
+
+    The job only runs when no private key existed, so whatever it wrote
+    (possibly half-written on failure) belongs to the declined setup.
+    """
+    p.spinner_message(_("ssh.discarding_key"))
+    try:
+        generated = key_future.result()
+    except Exception:
+        generated = True
+    if generated:
+        for path in (ssh_manager.private_key_path, ssh_manager.public_key_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+    p.spinner_done(_("ssh.key_discarded"))
 
 
 def _verify_cpolar_credentials(username: str, password: str) -> bool:
@@ -102,65 +179,33 @@ def _verify_cpolar_credentials(username: str, password: str) -> bool:
         NetworkError: If network connection fails
     """
     import requests
-    from bs4 import BeautifulSoup
+
+    from .auth import extract_csrf_token, login_succeeded
 
     base_url = "https://dashboard.cpolar.com"
     login_url = f"{base_url}/login"
 
-    session = requests.Session()
-    session.headers.update(
-        {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-    )
+    session = _get_verify_session()
 
     try:
         # Step 1: Get CSRF token
         response = session.get(login_url, timeout=10)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        csrf_input = soup.find("input", {"name": "csrf_token"})
-        if not csrf_input:
-            meta_csrf = soup.find("meta", {"name": "csrf-token"})
-            csrf_token = meta_csrf.get("content", "") if meta_csrf else ""
-        else:
-            csrf_token = csrf_input.get("value", "")
+        csrf_token = extract_csrf_token(response.content) or ""
 
         # Step 2: Submit login
-        login_data = {"login": username, "password": password, "csrf_token": csrf_token}
-
-        response = session.post(
-            login_url, data=login_data, timeout=10, allow_redirects=True
+        login_data = (
+            ("login", username),
+            ("password", password),
+            ("csrf_token", csrf_token),
         )
 
         # Step 3: Check result
-        response_text = response.text.lower()
-
-        # Failure indicators (based on actual cpolar responses)
-        failure_indicators = [
-            "not valid",  # "The email or password you entered is not valid."
-            "login failed",
-            "invalid credentials",
-            "incorrect password",
-            "authentication failed",
-            "登录失败",
-            "密码错误",
-            "无效",
-        ]
-        for indicator in failure_indicators:
-            if indicator in response_text:
-                return False
-
-        # Success indicators
-        if "/login" in response.url:
-            return False
-
-        if any(
-            path in response.url for path in ["/status", "/dashboard", "/get-started"]
-        ):
-            return True
-
-        success_indicators = ["logout", "status", "dashboard", "tunnel", "隧道"]
-        return any(indicator in response_text for indicator in success_indicators)
+        with session.post(
+            login_url, data=login_data, timeout=10, allow_redirects=False, stream=True
+        ) as response:
+            return login_succeeded(session, response)
 
     except requests.RequestException as e:
         raise NetworkError(_("error.network", error=str(e)))
@@ -168,6 +213,10 @@ def _verify_cpolar_credentials(username: str, password: str) -> bool:
 
 def _run_connect(ctx):
     """Run the connection flow with step-style output."""
+    from .auth import CpolarAuth
+    from .ssh import SSHManager
+    from .tunnel import TunnelManager
+
     config_manager = ctx.obj["config_manager"]
     p: Prompts = ctx.obj["prompts"]
     skip_confirm = ctx.obj["skip_confirm"]
@@ -208,16 +257,16 @@ def _run_connect(ctx):
         p.spinner_done(_("prompts.tunnel_found", url=tunnel_info.url))
 
         # Show connection summary
-        ports_str = ", ".join(str(port) for port in config.ports)
+        ports_str = ", ".join(map(str, config.ports))
 
         # Calculate max label width for alignment (including colon)
-        labels = [
+        labels = (
             _("label.host") + ":",
             _("label.user") + ":",
             _("label.alias") + ":",
             _("label.ports") + ":",
-        ]
-        max_width = max(_display_width(label) for label in labels)
+        )
+        max_width = _labels_max_width(labels)
 
         summary = f"""\
 {_pad_label(_('label.host') + ':', max_width)} {tunnel_info.hostname}:{tunnel_info.port}
@@ -242,13 +291,29 @@ def _run_connect(ctx):
 
         # Get server password if needed
         server_password = None
+        key_future = None
         if not can_connect:
+            # First connection: an RSA key pair takes seconds to generate, so
+            # make it in the background while the user types the server
+            # password (Ed25519 keys are instant and made in step 4)
+            if (
+                ssh_manager.key_type == "rsa"
+                and not ssh_manager.private_key_path.exists()
+            ):
+                from concurrent.futures import ThreadPoolExecutor
+
+                keygen_executor = ThreadPoolExecutor(max_workers=1)
+                key_future = keygen_executor.submit(ssh_manager.generate_ssh_key)
+                keygen_executor.shutdown(wait=False)
+
             p.spinner_done(_("prompts.first_connection"), success=False)
             p.log_warn(_("warning.first_connection"))
             server_password = p.password(
                 _("prompts.enter_server_password", user=config.server_user)
             )
             if server_password is None:
+                if key_future is not None:
+                    _discard_background_key(p, ssh_manager, key_future)
                 p.outro_cancel(_("prompts.cancelled"))
                 return
         else:
@@ -257,8 +322,11 @@ def _run_connect(ctx):
         # Step 4: Setup and Connect
         p.step(_("prompts.step_connect"))
 
-        # Generate SSH key if needed
-        key_generated = ssh_manager.generate_ssh_key()
+        # Generate SSH key if needed (or collect the background result)
+        if key_future is not None:
+            key_generated = key_future.result()
+        else:
+            key_generated = ssh_manager.generate_ssh_key()
         if key_generated:
             p.log_success(_("ssh.key_generated"))
         else:
@@ -267,7 +335,7 @@ def _run_connect(ctx):
         # Upload public key if needed (first connection)
         if server_password:
             p.spinner_message(_("ssh.uploading_key"))
-            key_uploaded = ssh_manager.upload_public_key(
+            key_uploaded, key_verified = ssh_manager.upload_public_key(
                 tunnel_info.hostname, tunnel_info.port, server_password
             )
             if key_uploaded:
@@ -275,8 +343,9 @@ def _run_connect(ctx):
             else:
                 p.spinner_done(_("warning.ssh_key_exists"))
 
-            # Verify connection after upload
-            if not ssh_manager.test_ssh_connection(
+            # Verify connection after upload, unless upload_public_key
+            # already saw the server accept the key
+            if not key_verified and not ssh_manager.test_ssh_connection(
                 tunnel_info.hostname, tunnel_info.port
             ):
                 raise SSHError(_("error.ssh_auth_failed"))
@@ -288,6 +357,9 @@ def _run_connect(ctx):
         # Connect if auto_connect is enabled
         if config.auto_connect:
             p.outro(_("prompts.connected"))
+            # Log out first: on POSIX connect() replaces this process with ssh
+            # and the finally block below never runs
+            auth.logout()
             ssh_manager.connect(tunnel_info, config.ports)
         else:
             p.log_info(f"ssh {ssh_manager.host_alias}")
@@ -425,9 +497,8 @@ def init(ctx, force, username, server_user, ports):
 
     # Parse ports
     if ports:
-        try:
-            ports_list = [int(pt.strip()) for pt in ports.split(",")]
-        except ValueError:
+        ports_list = _parse_ports(ports)
+        if ports_list is None:
             p.log_error(_("warning.invalid_port_format"))
             sys.exit(1)
     else:
@@ -436,12 +507,11 @@ def init(ctx, force, username, server_user, ports):
             if ports_input is None:
                 p.outro_cancel(_("prompts.cancelled"))
                 return
-            try:
-                ports_list = [int(pt.strip()) for pt in ports_input.split(",")]
+            ports_list = _parse_ports(ports_input)
+            if ports_list is not None:
                 break
-            except ValueError:
-                p.log_error(_("warning.invalid_port_format"))
-    p.log_success(_("prompts.ports_set", ports=", ".join(str(pt) for pt in ports_list)))
+            p.log_error(_("warning.invalid_port_format"))
+    p.log_success(_("prompts.ports_set", ports=", ".join(map(str, ports_list))))
 
     # Step 3: Connection Options
     p.step(_("prompts.step_options"))
@@ -454,20 +524,20 @@ def init(ctx, force, username, server_user, ports):
 
     # Show summary
     password_status = _("prompts.yes") if password else _("prompts.no")
-    labels = [
+    labels = (
         _("label.username") + ":",
         _("label.password") + ":",
         _("label.server_user") + ":",
         _("label.ports") + ":",
         _("label.auto_connect") + ":",
-    ]
-    max_width = max(_display_width(label) for label in labels)
+    )
+    max_width = _labels_max_width(labels)
 
     summary = f"""\
 {_pad_label(_('label.username') + ':', max_width)} {username}
 {_pad_label(_('label.password') + ':', max_width)} {password_status}
 {_pad_label(_('label.server_user') + ':', max_width)} {server_user}
-{_pad_label(_('label.ports') + ':', max_width)} {", ".join(str(pt) for pt in ports_list)}
+{_pad_label(_('label.ports') + ':', max_width)} {", ".join(map(str, ports_list))}
 {_pad_label(_('label.auto_connect') + ':', max_width)} {yes_no}"""
     p.note(summary, _("prompts.summary_config"))
 
@@ -548,12 +618,12 @@ def config_set(ctx, key, value):
 
         # Show change summary
         if not skip_confirm:
-            labels = [
+            labels = (
                 _("label.key") + ":",
                 _("label.current") + ":",
                 _("label.new") + ":",
-            ]
-            max_width = max(_display_width(label) for label in labels)
+            )
+            max_width = _labels_max_width(labels)
 
             summary = f"""\
 {_pad_label(_('label.key') + ':', max_width)} {key}
@@ -600,15 +670,15 @@ def config_show(ctx):
         data = config_manager.get_display_data()
 
         if output_format == "json":
-            print(json.dumps(data, indent=2))
+            print(_json_dumps(data))
         else:
-            from rich.table import Table
-
-            table = Table(
-                title=_("config.title"), show_header=True, header_style="bold magenta"
+            console = _get_console()
+            table = _key_value_table(
+                _("config.column_setting"),
+                _("config.column_value"),
+                key_width=20,
+                title=_("config.title"),
             )
-            table.add_column(_("config.column_setting"), style="cyan", width=20)
-            table.add_column(_("config.column_value"), style="white")
 
             # Add rows
             yes_no = _("prompts.yes") if data["auto_connect"] else _("prompts.no")
@@ -621,10 +691,11 @@ def config_show(ctx):
             table.add_row(_("config.username"), data["username"])
             table.add_row(_("config.base_url"), data["base_url"])
             table.add_row(_("config.server_user"), data["server_user"])
-            table.add_row(_("config.ports"), ", ".join(str(p) for p in data["ports"]))
+            table.add_row(_("config.ports"), ", ".join(map(str, data["ports"])))
             table.add_row(_("config.auto_connect"), yes_no)
             table.add_row(_("config.ssh_key_path"), data["ssh_key_path"])
             table.add_row(_("config.ssh_host_alias"), data["ssh_host_alias"])
+            table.add_row(_("config.ssh_key_type"), data["ssh_key_type"])
             table.add_row(_("config.ssh_key_size"), f"{data['ssh_key_size']} bits")
             table.add_row(_("config.log_level"), data["log_level"])
             table.add_row(
@@ -736,8 +807,11 @@ def doctor_cmd(ctx):
 def status_cmd(ctx):
     """Show tunnel & SSH status (no connection) / 显示隧道与 SSH 状态（不连接）"""
     from rich.panel import Panel
-    from rich.table import Table
 
+    from .auth import CpolarAuth
+    from .tunnel import TunnelManager
+
+    console = _get_console()
     config_manager: ConfigManager = ctx.obj["config_manager"]
     p: Prompts = ctx.obj["prompts"]
     output_format = ctx.obj["output_format"]
@@ -758,7 +832,7 @@ def status_cmd(ctx):
                 "username": config.username,
                 "server_user": config.server_user,
                 "ssh_alias": config.ssh_host_alias,
-                "ssh_key": os.path.expanduser(config.ssh_key_path),
+                "ssh_key": expand_path(config.ssh_key_path),
                 "auto_connect": config.auto_connect,
                 "ports": config.ports,
             },
@@ -771,7 +845,7 @@ def status_cmd(ctx):
             }
         if error:
             data["error"] = str(error)
-        print(json.dumps(data, indent=2))
+        print(_json_dumps(data))
 
     def _render(
         config, tunnel_info=None, local_only=False, reason_msg: Optional[str] = None
@@ -787,9 +861,9 @@ def status_cmd(ctx):
                 )
             )
 
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column(_("status.column.field"), style="cyan", width=22)
-        table.add_column(_("status.column.value"), style="white")
+        table = _key_value_table(
+            _("status.column.field"), _("status.column.value"), key_width=22
+        )
         if tunnel_info is not None:
             table.add_row(_("status.field.tunnel"), getattr(tunnel_info, "url", ""))
             table.add_row(_("status.field.host"), getattr(tunnel_info, "hostname", ""))
@@ -799,14 +873,10 @@ def status_cmd(ctx):
             table.add_row(_("status.field.host"), "-")
             table.add_row(_("status.field.port"), "-")
         table.add_row(_("status.field.ssh_alias"), config.ssh_host_alias)
-        table.add_row(
-            _("status.field.ssh_key"), os.path.expanduser(config.ssh_key_path)
-        )
+        table.add_row(_("status.field.ssh_key"), expand_path(config.ssh_key_path))
         yes_no = _("prompts.yes") if config.auto_connect else _("prompts.no")
         table.add_row(_("status.field.auto_connect"), yes_no)
-        table.add_row(
-            _("status.field.forward_ports"), ",".join(str(p) for p in config.ports)
-        )
+        table.add_row(_("status.field.forward_ports"), ",".join(map(str, config.ports)))
         console.print(table)
 
     try:
@@ -2,6 +2,7 @@
 Configuration management for Cpolar Connect
 """
 
+import functools
 import json
 import logging
 import os
@@ -16,6 +17,15 @@ from .i18n import _
 
 logger = logging.getLogger(__name__)
 
+# Supported SSH key types for generated keys
+SSH_KEY_TYPES = ("ed25519", "rsa")
+
+
+@functools.lru_cache(maxsize=None)
+def expand_path(path: str) -> str:
+    """Expand ~ in a configured path (HOME does not change during a run)"""
+    return os.path.expanduser(path)
+
 
 class CpolarConfig(BaseModel):
     """Cpolar configuration model with validation"""
@@ -36,7 +46,10 @@ class CpolarConfig(BaseModel):
         default="~/.ssh/id_rsa_cpolar", description="SSH private key path"
     )
     ssh_host_alias: str = Field(default="cpolar-server", description="SSH host alias")
-    ssh_key_size: int = Field(default=2048, description="SSH key size in bits")
+    ssh_key_type: str = Field(
+        default="ed25519", description="SSH key type (ed25519/rsa)"
+    )
+    ssh_key_size: int = Field(default=2048, description="RSA key size in bits")
 
     # Logging settings
     log_level: str = Field(default="INFO", description="Logging level")
@@ -53,6 +66,17 @@ class CpolarConfig(BaseModel):
                 raise ValueError(f"Invalid port: {port}. Must be between 1-65535")
         return v
 
+    @field_validator("ssh_key_type")
+    @classmethod
+    def validate_key_type(cls, v: str) -> str:
+        """Validate SSH key type"""
+        v_lower = v.lower()
+        if v_lower not in SSH_KEY_TYPES:
+            raise ValueError(
+                f"Invalid SSH key type: {v}. Must be one of: {', '.join(SSH_KEY_TYPES)}"
+            )
+        return v_lower
+
     @field_validator("ssh_key_size")
     @classmethod
     def validate_key_size(cls, v: int) -> int:
@@ -96,6 +120,9 @@ class ConfigManager:
         self.logs_dir.mkdir(parents=True, exist_ok=True)
 
         self._config: Optional[CpolarConfig] = None
+        # Password file contents, read at most once per run
+        self._stored_password: Optional[str] = None
+        self._stored_password_read = False
 
     def config_exists(self) -> bool:
         """Check if configuration file exists"""
@@ -103,16 +130,17 @@ class ConfigManager:
 
     def load_config(self) -> CpolarConfig:
         """Load and validate configuration from file"""
-        if not self.config_exists():
-            raise ConfigError(_("error.config_not_found", path=self.config_file))
-
         try:
+            # Open directly rather than stat first; a missing file surfaces
+            # as FileNotFoundError from the single open() call
             with open(self.config_file, "r", encoding="utf-8") as f:
-                config_data = json.load(f)
+                config_data = json.loads(f.read())
 
             self._config = CpolarConfig(**config_data)
             return self._config
 
+        except FileNotFoundError:
+            raise ConfigError(_("error.config_not_found", path=self.config_file))
         except json.JSONDecodeError as e:
             raise ConfigError(_("error.config_invalid_json", error=e))
         except Exception as e:
@@ -169,6 +197,8 @@ class ConfigManager:
             return config.ssh_key_path
         elif key == "ssh.host_alias":
             return config.ssh_host_alias
+        elif key == "ssh.key_type":
+            return config.ssh_key_type
         elif key == "ssh.key_size":
             return config.ssh_key_size
         elif key == "log_level":
@@ -228,6 +258,13 @@ class ConfigManager:
             config_dict["ssh_key_path"] = value
         elif key == "ssh.host_alias":
             config_dict["ssh_host_alias"] = value
+        elif key == "ssh.key_type":
+            value_lower = str(value).lower()
+            if value_lower not in SSH_KEY_TYPES:
+                raise ConfigError(
+                    f"Invalid SSH key type: {value}. Must be one of: {', '.join(SSH_KEY_TYPES)}"
+                )
+            config_dict["ssh_key_type"] = value_lower
         elif key == "ssh.key_size":
             # Handle integer value with error checking
             try:
@@ -297,6 +334,7 @@ class ConfigManager:
             "auto_connect": config.auto_connect,
             "ssh_key_path": config.ssh_key_path,
             "ssh_host_alias": config.ssh_host_alias,
+            "ssh_key_type": config.ssh_key_type,
             "ssh_key_size": config.ssh_key_size,
             "log_level": config.log_level,
             "language": config.language,
@@ -324,7 +362,14 @@ class ConfigManager:
         if password:
             return password
 
-        # Try password file
+        # Try password file; connect and login both ask for it
+        if not self._stored_password_read:
+            self._stored_password = self._read_password_file()
+            self._stored_password_read = True
+        return self._stored_password
+
+    def _read_password_file(self) -> Optional[str]:
+        """Read the stored password file, if any"""
         if self.password_file.exists():
             try:
                 return self.password_file.read_text(encoding="utf-8").strip()
@@ -342,6 +387,8 @@ class ConfigManager:
             self.password_file.chmod(0o600)
         except Exception as e:
             raise ConfigError(_("error.password_store_failed", error=e))
+        finally:
+            self._stored_password_read = False
 
     def has_stored_password(self, username: str) -> bool:
         """Check if password is stored"""
@@ -359,6 +406,7 @@ class ConfigManager:
             return False
         try:
             self.password_file.unlink()
+            self._stored_password_read = False
             return True
         except Exception as e:
             raise ConfigError(_("error.password_clear_failed", error=e))
@@ -10,17 +10,17 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 import requests
-from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 
 from .auth import CpolarAuth
-from .config import ConfigError, ConfigManager
+from .config import ConfigError, ConfigManager, expand_path
 from .exceptions import AuthenticationError, NetworkError, TunnelError
 from .i18n import _
+from .prompts import create_console
 from .tunnel import TunnelManager
 
-console = Console()
+console = create_console()
 
 
 class Doctor:
@@ -195,7 +195,7 @@ class Doctor:
         """Check SSH key"""
         try:
             config = self.config_manager.get_config()
-            ssh_key_path = Path(config.ssh_key_path).expanduser()
+            ssh_key_path = Path(expand_path(config.ssh_key_path))
 
             if ssh_key_path.exists():
                 # Check permissions
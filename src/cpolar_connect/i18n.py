@@ -41,6 +41,8 @@ class Messages:
         "ssh.generating_key": "Generating SSH key pair...",
         "ssh.key_generated": "SSH key pair generated",
         "ssh.key_exists": "SSH key already exists: {path}",
+        "ssh.discarding_key": "Discarding the unused SSH key pair",
+        "ssh.key_discarded": "Unused SSH key pair removed",
         "ssh.uploading_key": "Uploading public key to server...",
         "ssh.need_password_for_key_upload": "Need password to upload SSH key to server",
         "ssh.trying_connect": "Attempting SSH connection as {username}@{hostname}...",
@@ -101,6 +103,7 @@ class Messages:
         "config.auto_connect": "Auto Connect",
         "config.ssh_key_path": "SSH Key Path",
         "config.ssh_host_alias": "SSH Host Alias",
+        "config.ssh_key_type": "SSH Key Type",
         "config.ssh_key_size": "SSH Key Size",
         "config.log_level": "Log Level",
         "config.language": "Language",
@@ -305,6 +308,8 @@ class Messages:
         "ssh.generating_key": "正在生成 SSH 密钥对...",
         "ssh.key_generated": "SSH 密钥对已生成",
         "ssh.key_exists": "SSH 密钥已存在：{path}",
+        "ssh.discarding_key": "正在丢弃未使用的 SSH 密钥对",
+        "ssh.key_discarded": "已删除未使用的 SSH 密钥对",
         "ssh.uploading_key": "正在上传公钥到服务器...",
         "ssh.need_password_for_key_upload": "需要密码来上传 SSH 密钥到服务器",
         "ssh.trying_connect": "正在尝试以 {username}@{hostname} 进行 SSH 连接...",
@@ -365,6 +370,7 @@ class Messages:
         "config.auto_connect": "自动连接",
         "config.ssh_key_path": "SSH 密钥路径",
         "config.ssh_host_alias": "SSH 主机别名",
+        "config.ssh_key_type": "SSH 密钥类型",
         "config.ssh_key_size": "SSH 密钥大小",
         "config.log_level": "日志级别",
         "config.language": "语言",
@@ -4,9 +4,15 @@ Step-style CLI prompts inspired by @clack/prompts
 Provides a clean, step-by-step interaction style for CLI applications.
 """
 
+import functools
+import os
+import re
 import sys
 from getpass import getpass
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from rich.console import Console
 
 # ANSI color codes
 CYAN = "\033[36m"
@@ -23,20 +29,167 @@ STEP_ACTIVE = "◆"
 STEP_DONE = "●"
 STEP_ERROR = "■"
 
-
-def _display_width(text: str) -> int:
+# Precomposed styled symbols: one SGR sequence per fragment instead of
+# formatting the codes around the symbol on every call
+SYM_PENDING = f"{DIM}{STEP_PENDING}{RESET}"
+SYM_ACTIVE = f"{CYAN}{STEP_ACTIVE}{RESET}"
+SYM_DONE = f"{GREEN}{STEP_DONE}{RESET}"
+SYM_ERROR = f"{RED}{STEP_ERROR}{RESET}"
+MARK_SUCCESS = f"{GREEN}✓{RESET}"
+MARK_FAILURE = f"{RED}✗{RESET}"
+MARK_WARN = f"{YELLOW}⚠{RESET}"
+MARK_SPINNER = f"{CYAN}◌{RESET}"
+MARK_DEFAULT = f"{GREEN}●{RESET}"
+MARK_UNSELECTED = f"{DIM}○{RESET}"
+BAR_OPEN = f"{CYAN}┌{RESET}"
+BAR_CLOSE = f"{GREEN}└{RESET}"
+BAR_CANCEL = f"{YELLOW}└{RESET}"
+
+_STEP_SYMBOLS = {
+    "pending": SYM_PENDING,
+    "active": SYM_ACTIVE,
+    "done": SYM_DONE,
+    "error": SYM_ERROR,
+}
+
+
+class _Style(NamedTuple):
+    """Styled fragments used by Prompts"""
+
+    dim: str
+    bold: str
+    reset: str
+    bar_open: str
+    bar_close: str
+    bar_cancel: str
+    mark_success: str
+    mark_failure: str
+    mark_warn: str
+    mark_spinner: str
+    mark_default: str
+    mark_unselected: str
+    steps: Dict[str, str]
+
+
+_COLOR_STYLE = _Style(
+    DIM,
+    BOLD,
+    RESET,
+    BAR_OPEN,
+    BAR_CLOSE,
+    BAR_CANCEL,
+    MARK_SUCCESS,
+    MARK_FAILURE,
+    MARK_WARN,
+    MARK_SPINNER,
+    MARK_DEFAULT,
+    MARK_UNSELECTED,
+    _STEP_SYMBOLS,
+)
+
+# Same symbols without escape codes, for pipes, logs and NO_COLOR
+_PLAIN_STYLE = _Style(
+    "",
+    "",
+    "",
+    "┌",
+    "└",
+    "└",
+    "✓",
+    "✗",
+    "⚠",
+    "◌",
+    "●",
+    "○",
+    {
+        "pending": STEP_PENDING,
+        "active": STEP_ACTIVE,
+        "done": STEP_DONE,
+        "error": STEP_ERROR,
+    },
+)
+
+
+def _use_color() -> bool:
+    """Color only an interactive stdout, honouring https://no-color.org"""
+    if os.environ.get("NO_COLOR"):
+        return False
+    try:
+        return sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def create_console() -> "Console":
+    """
+    Create a rich console that highlights only on an interactive stdout
+
+    Redirected output carries no styles, so the repr highlighter's regex
+    pass over every printed string is wasted there. Markup is still
+    parsed: command output relies on it.
+    """
+    from rich.console import Console
+
+    return Console(highlight=_use_color())
+
+
+# Characters rendered two columns wide: CJK Unified Ideographs, CJK
+# Extension A and fullwidth forms
+_WIDE_CHARS_RE = re.compile("[\u4e00-\u9fff\u3400-\u4dbf\uff00-\uffef]")
+
+
+@functools.lru_cache(maxsize=512)
+def display_width(text: str) -> int:
     """Calculate display width considering CJK characters."""
-    width = 0
-    for char in text:
-        if "\u4e00" <= char <= "\u9fff":  # CJK Unified Ideographs
-            width += 2
-        elif "\u3400" <= char <= "\u4dbf":  # CJK Extension A
-            width += 2
-        elif "\uff00" <= char <= "\uffef":  # Fullwidth ASCII
-            width += 2
-        else:
-            width += 1
-    return width
+    # English labels and most messages are pure ASCII: one column each
+    if text.isascii():
+        return len(text)
+    # Wide characters count twice; stripping them is a single C-level scan
+    return 2 * len(text) - len(_WIDE_CHARS_RE.sub("", text))
+
+
+def _read_password(fd: int, prompt: str) -> str:
+    """
+    Read a line from a terminal fd without echo.
+
+    Canonical mode caps a line at MAX_CANON bytes (1024 on macOS), which
+    truncates long pasted secrets, so the terminal is switched to
+    non-canonical mode and backspace is handled here. Ctrl-C still raises
+    KeyboardInterrupt; Ctrl-D on an empty line raises EOFError.
+    """
+    import termios
+
+    old_attrs = termios.tcgetattr(fd)
+    new_attrs = termios.tcgetattr(fd)
+    new_attrs[3] &= ~(termios.ECHO | termios.ICANON)
+    new_attrs[6][termios.VMIN] = 1
+    new_attrs[6][termios.VTIME] = 0
+
+    termios.tcsetattr(fd, termios.TCSAFLUSH, new_attrs)
+    try:
+        os.write(fd, prompt.encode("utf-8"))
+        buf = bytearray()
+        while True:
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                raise EOFError
+            for byte in chunk:
+                if byte in (0x0A, 0x0D):
+                    return buf.decode("utf-8", "replace")
+                if byte in (0x08, 0x7F):
+                    # Drop the last character, including UTF-8 continuation bytes
+                    while buf and 0x80 <= buf[-1] < 0xC0:
+                        buf.pop()
+                    if buf:
+                        buf.pop()
+                elif byte == 0x04:
+                    if not buf:
+                        raise EOFError
+                else:
+                    buf.append(byte)
+    finally:
+        termios.tcsetattr(fd, termios.TCSAFLUSH, old_attrs)
+        os.write(fd, b"\n")
 
 
 class Prompts:
@@ -52,27 +205,27 @@ class Prompts:
         """
         self.skip_confirm = skip_confirm
         self.quiet = quiet
+        self._style = _COLOR_STYLE if _use_color() else _PLAIN_STYLE
 
     def intro(self, message: str) -> None:
         """Display intro banner"""
         if self.quiet:
             return
-        print()
-        print(f"{CYAN}┌{RESET} {BOLD}{message}{RESET}")
+        sys.stdout.write(
+            f"\n{self._style.bar_open} {self._style.bold}{message}{self._style.reset}\n"
+        )
 
     def outro(self, message: str) -> None:
         """Display outro message"""
         if self.quiet:
             return
-        print(f"{GREEN}└{RESET} {message}")
-        print()
+        sys.stdout.write(f"{self._style.bar_close} {message}\n\n")
 
     def outro_cancel(self, message: str = "Operation cancelled") -> None:
         """Display cancellation message"""
         if self.quiet:
             return
-        print(f"{YELLOW}└{RESET} {message}")
-        print()
+        sys.stdout.write(f"{self._style.bar_cancel} {message}\n\n")
 
     def step(self, message: str, status: str = "active") -> None:
         """
@@ -84,13 +237,8 @@ class Prompts:
         """
         if self.quiet:
             return
-        symbols = {
-            "pending": f"{DIM}{STEP_PENDING}{RESET}",
-            "active": f"{CYAN}{STEP_ACTIVE}{RESET}",
-            "done": f"{GREEN}{STEP_DONE}{RESET}",
-            "error": f"{RED}{STEP_ERROR}{RESET}",
-        }
-        symbol = symbols.get(status, symbols["active"])
+        steps = self._style.steps
+        symbol = steps.get(status, steps["active"])
         print(f"{symbol}  {message}")
 
     def log(self, message: str) -> None:
@@ -107,17 +255,17 @@ class Prompts:
 
     def log_warn(self, message: str) -> None:
         """Log warning message"""
-        print(f"│  {YELLOW}⚠{RESET} {message}")
+        print(f"│  {self._style.mark_warn} {message}")
 
     def log_error(self, message: str) -> None:
         """Log error message"""
-        print(f"│  {RED}✗{RESET} {message}")
+        print(f"│  {self._style.mark_failure} {message}")
 
     def log_success(self, message: str) -> None:
         """Log success message"""
         if self.quiet:
             return
-        print(f"│  {GREEN}✓{RESET} {message}")
+        print(f"│  {self._style.mark_success} {message}")
 
     def note(self, message: str, title: Optional[str] = None) -> None:
         """
@@ -129,12 +277,13 @@ class Prompts:
         """
         if self.quiet:
             return
-        print("│")
+        lines = ["│"]
         if title:
-            print(f"│  {DIM}─── {title} ───{RESET}")
-        for line in message.split("\n"):
-            print(f"│  {line}")
-        print("│")
+            lines.append(f"│  {self._style.dim}─── {title} ───{self._style.reset}")
+        lines.extend(f"│  {line}" for line in message.split("\n"))
+        lines.append("│")
+        # One write for the whole box
+        sys.stdout.write("\n".join(lines) + "\n")
 
     def text(
         self,
@@ -153,17 +302,19 @@ class Prompts:
         Returns:
             User input or None if cancelled
         """
-        hint = f" {DIM}({default}){RESET}" if default else ""
+        style = self._style
+        hint = f" {style.dim}({default}){style.reset}" if default else ""
         prompt_str = f"│  {message}{hint}: "
 
         try:
-            result = input(prompt_str).strip()
-            if not result and default:
-                return default
-            if not result and required:
-                self.log_warn("This field is required")
-                return self.text(message, default, required)
-            return result
+            while True:
+                result = input(prompt_str).strip()
+                if not result and default:
+                    return default
+                if not result and required:
+                    self.log_warn("This field is required")
+                    continue
+                return result
         except (KeyboardInterrupt, EOFError):
             print()
             return None
@@ -178,8 +329,19 @@ class Prompts:
         Returns:
             Password or None if cancelled
         """
+        prompt_str = f"│  {message}: "
         try:
-            return getpass(f"│  {message}: ")
+            if os.name != "nt":
+                try:
+                    fd = os.open("/dev/tty", os.O_RDWR | os.O_NOCTTY)
+                except OSError:
+                    # No controlling terminal (e.g. piped input)
+                    return getpass(prompt_str)
+                try:
+                    return _read_password(fd, prompt_str)
+                finally:
+                    os.close(fd)
+            return getpass(prompt_str)
         except (KeyboardInterrupt, EOFError):
             print()
             return None
@@ -227,7 +389,8 @@ class Prompts:
         Returns:
             Selected value or None if cancelled
         """
-        print(f"│  {message}")
+        style = self._style
+        lines = [f"│  {message}"]
 
         for i, choice in enumerate(choices, 1):
             label = choice.get("label", choice.get("value", ""))
@@ -235,28 +398,39 @@ class Prompts:
             value = choice.get("value", label)
             is_default = value == default
 
-            marker = f"{GREEN}●{RESET}" if is_default else f"{DIM}○{RESET}"
-            hint_str = f" {DIM}({hint}){RESET}" if hint else ""
-            default_str = f" {DIM}[default]{RESET}" if is_default else ""
+            marker = style.mark_default if is_default else style.mark_unselected
+            # Hint and default tag share a single dim run
+            dim_parts = []
+            if hint:
+                dim_parts.append(f"({hint})")
+            if is_default:
+                dim_parts.append("[default]")
+            dim_str = (
+                f" {style.dim}{' '.join(dim_parts)}{style.reset}" if dim_parts else ""
+            )
+
+            lines.append(f"│    {marker} {i}. {label}{dim_str}")
 
-            print(f"│    {marker} {i}. {label}{hint_str}{default_str}")
+        # Render the whole menu in one write
+        sys.stdout.write("\n".join(lines) + "\n")
 
         prompt_str = f"│  Enter number (1-{len(choices)}): "
 
         try:
-            result = input(prompt_str).strip()
-            if not result and default:
-                return default
+            # Re-prompt in place on invalid input; the menu stays above
+            while True:
+                result = input(prompt_str).strip()
+                if not result and default:
+                    return default
 
-            try:
-                idx = int(result) - 1
-                if 0 <= idx < len(choices):
-                    return choices[idx].get("value", choices[idx].get("label"))
-            except ValueError:
-                pass
+                try:
+                    idx = int(result) - 1
+                    if 0 <= idx < len(choices):
+                        return choices[idx].get("value", choices[idx].get("label"))
+                except ValueError:
+                    pass
 
-            self.log_warn(f"Please enter a number between 1 and {len(choices)}")
-            return self.select(message, choices, default)
+                self.log_warn(f"Please enter a number between 1 and {len(choices)}")
 
         except (KeyboardInterrupt, EOFError):
             print()
@@ -280,7 +454,8 @@ class Prompts:
             List of selected values or None if cancelled
         """
         initial = initial or []
-        print(f"│  {message}")
+        style = self._style
+        lines = [f"│  {message}"]
 
         for i, choice in enumerate(choices, 1):
             label = choice.get("label", choice.get("value", ""))
@@ -288,10 +463,12 @@ class Prompts:
             value = choice.get("value", label)
             is_selected = value in initial
 
-            marker = f"{GREEN}✓{RESET}" if is_selected else f"{DIM}○{RESET}"
-            hint_str = f" {DIM}({hint}){RESET}" if hint else ""
+            marker = style.mark_success if is_selected else style.mark_unselected
+            hint_str = f" {style.dim}({hint}){style.reset}" if hint else ""
+
+            lines.append(f"│    {marker} {i}. {label}{hint_str}")
 
-            print(f"│    {marker} {i}. {label}{hint_str}")
+        sys.stdout.write("\n".join(lines) + "\n")
 
         prompt_str = f"│  Enter numbers separated by comma (e.g., 1,3): "
 
@@ -327,8 +504,8 @@ class Prompts:
         if self.quiet:
             return
         # Store display width for clearing (not byte length)
-        self._last_spinner_width = _display_width(f"│  ◌ {message}...")
-        print(f"│  {CYAN}◌{RESET} {message}...", end="", flush=True)
+        self._last_spinner_width = display_width(message) + 8  # "│  ◌ " + "..."
+        print(f"│  {self._style.mark_spinner} {message}...", end="", flush=True)
 
     def spinner_done(self, message: str, success: bool = True) -> None:
         """
@@ -340,9 +517,9 @@ class Prompts:
         """
         if self.quiet:
             return
-        symbol = f"{GREEN}✓{RESET}" if success else f"{RED}✗{RESET}"
+        symbol = self._style.mark_success if success else self._style.mark_failure
         # Calculate padding based on display width
-        done_width = _display_width(f"│  ✓ {message}")
+        done_width = display_width(message) + 5  # "│  ✓ "
         clear_width = getattr(self, "_last_spinner_width", 50)
         padding = max(0, clear_width - done_width)
         print(f"\r│  {symbol} {message}" + " " * padding)
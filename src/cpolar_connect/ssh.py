@@ -2,22 +2,105 @@
 SSH management module for Cpolar Connect
 """
 
+import functools
 import logging
 import os
+import re
+import shlex
 import stat
 import subprocess
+import sys
+import tempfile
 from pathlib import Path
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-import paramiko
-
-from .config import CpolarConfig
+from .config import CpolarConfig, expand_path
 from .exceptions import SSHError
 from .i18n import _
 from .tunnel import TunnelInfo
 
+if TYPE_CHECKING:
+    import paramiko
+
 logger = logging.getLogger(__name__)
 
+# Remote POSIX sh script (run through "sh -c", whatever the login shell)
+# that ensures ~/.ssh/authorized_keys exists with correct permissions and
+# appends the key unless it is already a whole line in it. An unterminated
+# last line gets its newline first. Prints "present" or "added".
+_AUTHORIZE_KEY_SCRIPT = (
+    "key={key}; f=~/.ssh/authorized_keys; "
+    'mkdir -p ~/.ssh && chmod 700 ~/.ssh && touch "$f" && chmod 600 "$f" && '
+    'if grep -qxF -- "$key" "$f"; then echo present; '
+    'else {{ if [ -n "$(tail -c 1 "$f")" ]; then echo; fi; '
+    'printf \'%s\\n\' "$key"; }} >> "$f" && echo added; fi'
+)
+
+
+def _open_ssh(
+    hostname: str,
+    port: int,
+    username: str,
+    pkey: Optional["paramiko.PKey"] = None,
+    password: Optional[str] = None,
+    timeout: int = 30,
+    client: Optional["paramiko.SSHClient"] = None,
+) -> "paramiko.SSHClient":
+    """
+    Connect and authenticate an SSH client with exactly these credentials
+
+    Pass ``client`` to connect that client, or, if its connection is still
+    open but not authenticated (e.g. the key was rejected), to retry on the
+    same transport instead of opening a new connection.
+
+    Raises:
+        paramiko.AuthenticationException: If authentication fails
+    """
+    import paramiko
+
+    created = client is None
+    if client is not None:
+        transport = client.get_transport()
+        if transport is not None and transport.is_active():
+            if password is not None:
+                transport.auth_password(username, password)
+            else:
+                transport.auth_publickey(username, pkey)
+            return client
+    else:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+    try:
+        client.connect(
+            hostname=hostname,
+            port=port,
+            username=username,
+            pkey=pkey,
+            password=password,
+            timeout=timeout,
+            # Only the credentials given here; stray keys would eat into the
+            # server's MaxAuthTries before the password is tried
+            allow_agent=False,
+            look_for_keys=False,
+        )
+    except Exception:
+        # A client the caller never sees would otherwise leak its socket
+        if created:
+            client.close()
+        raise
+    return client
+
+
+@functools.lru_cache(maxsize=None)
+def _host_block_pattern(alias: str) -> "re.Pattern[str]":
+    """Compile the pattern matching the Host block for ``alias``"""
+    # [^\S\n] is whitespace other than newline, mirroring str.strip(); the
+    # negative lookahead classifies each body line in a single scan
+    header = rf"^[^\S\n]*Host {re.escape(alias)}[^\S\n]*(?:\n|\Z)"
+    body_line = r"(?![^\S\n]*(?:Host |Match |\n|\Z))[^\n]*(?:\n|\Z)"
+    return re.compile(f"{header}(?:{body_line})*", re.MULTILINE)
+
 
 class SSHManager:
     """Manage SSH keys and connections"""
@@ -30,23 +113,30 @@ class SSHManager:
             config: CpolarConfig object
         """
         self.config = config
-        self.private_key_path = Path(os.path.expanduser(config.ssh_key_path))
-        self.public_key_path = Path(str(self.private_key_path) + ".pub")
+        self.private_key_path = Path(expand_path(config.ssh_key_path))
+        self.public_key_path = self.private_key_path.with_name(
+            self.private_key_path.name + ".pub"
+        )
         self.ssh_dir = self.private_key_path.parent
         self.ssh_config_path = Path.home() / ".ssh" / "config"
         self.host_alias = config.ssh_host_alias
         self.server_user = config.server_user
+        self.key_type = config.ssh_key_type
         self.key_size = config.ssh_key_size
+        # Parsed private key, tagged with the key file's st_mtime_ns
+        self._key_cache: Optional[Tuple[int, "paramiko.PKey"]] = None
 
     def ensure_ssh_directory(self) -> None:
         """Ensure .ssh directory exists with correct permissions"""
-        if not self.ssh_dir.exists():
-            try:
-                self.ssh_dir.mkdir(parents=True, mode=0o700, exist_ok=True)
-                logger.info(f"Created SSH directory: {self.ssh_dir}")
-            except Exception as e:
-                logger.error(f"Failed to create SSH directory: {e}")
-                raise SSHError(_("error.ssh_dir_failed", error=e))
+        # A single mkdir: FileExistsError is the common, already-set-up case
+        try:
+            self.ssh_dir.mkdir(parents=True, mode=0o700)
+            logger.info(f"Created SSH directory: {self.ssh_dir}")
+        except FileExistsError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to create SSH directory: {e}")
+            raise SSHError(_("error.ssh_dir_failed", error=e))
 
     def generate_ssh_key(self, force: bool = False) -> bool:
         """
@@ -70,23 +160,27 @@ class SSHManager:
 
             return False
 
+        # paramiko (and cryptography) are only needed on first-time setup
+        import paramiko
+
         # Generate new key pair
         try:
-            key = paramiko.RSAKey.generate(self.key_size)
-
-            # Save private key
-            key.write_private_key_file(str(self.private_key_path))
+            if self.key_type == "ed25519":
+                key = self._generate_ed25519_key()
+            else:
+                key = paramiko.RSAKey.generate(self.key_size)
+                key.write_private_key_file(str(self.private_key_path))
 
             # Set correct permissions (600)
             try:
                 os.chmod(self.private_key_path, stat.S_IRUSR | stat.S_IWUSR)
             except Exception as e:
                 logger.warning(f"Failed to set private key permissions: {e}")
+            self._key_cache = (os.stat(self.private_key_path).st_mtime_ns, key)
 
             # Save public key
-            public_key_text = f"ssh-rsa {key.get_base64()} cpolar-connect"
-            with open(self.public_key_path, "w", encoding="utf-8") as f:
-                f.write(public_key_text + "\n")
+            public_key_text = f"{key.get_name()} {key.get_base64()} cpolar-connect"
+            self.public_key_path.write_text(public_key_text + "\n", encoding="utf-8")
 
             logger.info(f"Generated new SSH key pair at {self.private_key_path}")
             return True
@@ -95,14 +189,48 @@ class SSHManager:
             logger.error(f"Failed to generate SSH key: {e}")
             raise SSHError(_("error.ssh_key_gen_failed", error=e))
 
+    def _generate_ed25519_key(self) -> "paramiko.Ed25519Key":
+        """Generate an Ed25519 key and save it in OpenSSH format"""
+        import io
+
+        import paramiko
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+            Ed25519PrivateKey,
+        )
+
+        # paramiko can read but not generate or write Ed25519 keys
+        private_bytes = Ed25519PrivateKey.generate().private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.OpenSSH,
+            serialization.NoEncryption(),
+        )
+        # Created 0600 from the start, like paramiko's write_private_key_file
+        fd = os.open(
+            self.private_key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+        )
+        with os.fdopen(fd, "wb") as f:
+            f.write(private_bytes)
+        return paramiko.Ed25519Key(file_obj=io.StringIO(private_bytes.decode("ascii")))
+
+    def _load_private_key(self) -> "paramiko.PKey":
+        """Load the private key, reusing the parsed key while the file is unchanged"""
+        mtime_ns = os.stat(self.private_key_path).st_mtime_ns
+        if self._key_cache is None or self._key_cache[0] != mtime_ns:
+            import paramiko
+
+            # Detects the key type, so existing RSA keys keep working
+            key = paramiko.PKey.from_path(self.private_key_path)
+            self._key_cache = (mtime_ns, key)
+        return self._key_cache[1]
+
     def _regenerate_public_key(self) -> None:
         """Regenerate public key from existing private key"""
         try:
-            key = paramiko.RSAKey.from_private_key_file(str(self.private_key_path))
-            public_key_text = f"ssh-rsa {key.get_base64()} cpolar-connect"
+            key = self._load_private_key()
+            public_key_text = f"{key.get_name()} {key.get_base64()} cpolar-connect"
 
-            with open(self.public_key_path, "w", encoding="utf-8") as f:
-                f.write(public_key_text + "\n")
+            self.public_key_path.write_text(public_key_text + "\n", encoding="utf-8")
 
             logger.info(f"Regenerated public key: {self.public_key_path}")
 
@@ -122,31 +250,54 @@ class SSHManager:
         Returns:
             True if connection successful, False otherwise
         """
+        # Use the native client in batch mode: no paramiko import on the
+        # common re-run path, and ssh-agent keys count just like for the
+        # real connection
+        ssh_command = [
+            "ssh",
+            "-i",
+            str(self.private_key_path),
+            "-p",
+            str(port),
+            "-o",
+            "BatchMode=yes",
+            "-o",
+            "PreferredAuthentications=publickey",
+            "-o",
+            "StrictHostKeyChecking=no",
+            "-o",
+            "UserKnownHostsFile=/dev/null",
+            "-o",
+            f"ConnectTimeout={timeout}",
+            f"{self.server_user}@{hostname}",
+            "true",
+        ]
+
         try:
-            key = paramiko.RSAKey.from_private_key_file(str(self.private_key_path))
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-            ssh.connect(
-                hostname=hostname,
-                port=port,
-                username=self.server_user,
-                pkey=key,
-                timeout=timeout,
+            result = subprocess.run(
+                ssh_command,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                timeout=timeout * 3,
             )
-            ssh.close()
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.error(f"SSH connection test failed: {e}")
+            return False
 
+        if result.returncode == 0:
             logger.info("SSH key authentication successful")
             return True
 
-        except paramiko.AuthenticationException:
+        if "Permission denied" in result.stderr:
             logger.warning("SSH key authentication failed")
-            return False
-        except Exception as e:
-            logger.error(f"SSH connection test failed: {e}")
-            return False
+        else:
+            logger.error(f"SSH connection test failed: {result.stderr.strip()}")
+        return False
 
-    def upload_public_key(self, hostname: str, port: int, password: str) -> bool:
+    def upload_public_key(
+        self, hostname: str, port: int, password: str
+    ) -> Tuple[bool, bool]:
         """
         Upload public key to remote server's authorized_keys
 
@@ -156,58 +307,68 @@ class SSHManager:
             password: Server password
 
         Returns:
-            True if key was uploaded, False if already exists
+            Tuple of (uploaded, verified): uploaded is False if the key was
+            already present; verified is True if the server is known to accept
+            the key (before or right after the upload), so no separate key
+            test is needed
         """
         # Read public key
         if not self.public_key_path.exists():
             raise SSHError(_("error.ssh_pubkey_not_found", path=self.public_key_path))
 
-        with open(self.public_key_path, "r", encoding="utf-8") as f:
-            public_key_text = f.read().strip()
+        public_key_line = self.public_key_path.read_text(encoding="utf-8").strip()
 
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        import paramiko
 
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         try:
-            # Connect with password
-            ssh.connect(
-                hostname=hostname,
-                port=port,
-                username=self.server_user,
-                password=password,
-                timeout=30,
-                allow_agent=False,
-                look_for_keys=False,
-            )
-
-            # Ensure .ssh directory exists
-            stdin, stdout, stderr = ssh.exec_command(
-                "mkdir -p ~/.ssh && chmod 700 ~/.ssh"
-            )
-            stdout.read()
-
-            # Check if key already exists
-            stdin, stdout, stderr = ssh.exec_command(
-                "cat ~/.ssh/authorized_keys 2>/dev/null || true"
+            # Offer the key first: if the server already accepts it there is
+            # nothing to upload or re-test. A rejection leaves the transport
+            # open, so the password attempt below reuses the same connection.
+            key = self._load_private_key()
+            try:
+                _open_ssh(hostname, port, self.server_user, pkey=key, client=client)
+                logger.info("Server already accepts the SSH key")
+                return False, True
+            except paramiko.AuthenticationException:
+                pass
+
+            _open_ssh(
+                hostname, port, self.server_user, password=password, client=client
             )
-            existing_keys = stdout.read().decode("utf-8")
 
-            if public_key_text in existing_keys:
+            # Prepare ~/.ssh, check for the key and append it in a single
+            # remote command: grep stops at the first matching line and
+            # nothing but a one-word result comes back over the network.
+            # exec_command runs under the user's login shell, which may be
+            # fish or csh, so the script is handed to sh explicitly
+            script = _AUTHORIZE_KEY_SCRIPT.format(key=shlex.quote(public_key_line))
+            stdin, stdout, stderr = client.exec_command(f"sh -c {shlex.quote(script)}")
+            exit_code = stdout.channel.recv_exit_status()
+            result = stdout.read().strip()
+
+            if exit_code != 0 or result not in (b"present", b"added"):
+                detail = stderr.read().decode("utf-8", "replace").strip()
+                raise RuntimeError(detail or f"remote exit status {exit_code}")
+
+            if result == b"present":
                 logger.info("Public key already exists in authorized_keys")
-                ssh.close()
-                return False
-            else:
-                # Append public key
-                escaped_key = public_key_text.replace("'", "'\"'\"'")
-                command = f"echo '{escaped_key}' >> ~/.ssh/authorized_keys"
-                stdin, stdout, stderr = ssh.exec_command(command)
+                return False, False
 
-                # Set permissions
-                ssh.exec_command("chmod 600 ~/.ssh/authorized_keys")
+            logger.info("Public key uploaded to remote server")
 
-                logger.info("Public key uploaded to remote server")
-                ssh.close()
-                return True
+            # Confirm the key right away while paramiko is loaded: a key-only
+            # handshake, with no ssh process to spawn and no remote command.
+            # The password session cannot be reused, since SSH allows only
+            # one successful authentication per connection.
+            client.close()
+            try:
+                _open_ssh(hostname, port, self.server_user, pkey=key).close()
+            except (paramiko.SSHException, OSError) as e:
+                logger.warning(f"Uploaded key not accepted yet: {e}")
+                return True, False
+            return True, True
 
         except paramiko.AuthenticationException as e:
             logger.error(f"SSH authentication failed: {e}")
@@ -221,6 +382,8 @@ class SSHManager:
         except Exception as e:
             logger.error(f"Failed to upload public key: {e}")
             raise SSHError(_("error.ssh_upload_failed", error=e))
+        finally:
+            client.close()
 
     def update_ssh_config(
         self, tunnel_info: TunnelInfo, ports: Optional[List[int]] = None
@@ -232,76 +395,138 @@ class SSHManager:
             tunnel_info: TunnelInfo object with hostname and port
             ports: Optional list of local ports to forward
         """
+        # Prepare new host block as a single string
+        new_block_text = (
+            f"Host {self.host_alias}\n"
+            f"\tHostName {tunnel_info.hostname}\n"
+            f"\tPort {tunnel_info.port}\n"
+            f"\tUser {self.server_user}\n"
+            f"\tIdentityFile {self.private_key_path}\n"
+            "\tPreferredAuthentications publickey\n"
+            "\tStrictHostKeyChecking no\n"
+            "\tUserKnownHostsFile /dev/null\n"
+            "\tServerAliveInterval 30\n"
+            "\tServerAliveCountMax 3\n"
+        )
+
+        # Add port forwarding if specified
+        if ports:
+            new_block_text += "".join(
+                f"\tLocalForward {port} localhost:{port}\n" for port in ports
+            )
+
+        # Fast path: the config is unchanged since we last wrote this block
+        if self._read_config_stamp() == new_block_text:
+            logger.debug(f"SSH config already up to date: {self.ssh_config_path}")
+            return
+
         if not self.ssh_config_path.parent.exists():
             self.ssh_config_path.parent.mkdir(parents=True, mode=0o700, exist_ok=True)
 
-        # Create config file if not exists
-        if not self.ssh_config_path.exists():
-            self.ssh_config_path.touch(mode=0o600)
-            with open(self.ssh_config_path, "w", encoding="utf-8") as f:
-                f.write("# SSH config file\n")
+        # Read existing config, creating it (mode 600) with one open if missing
+        try:
+            content = self.ssh_config_path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            content = "# SSH config file\n"
+            fd = os.open(
+                self.ssh_config_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
             logger.info(f"Created SSH config file: {self.ssh_config_path}")
 
-        # Read existing config
-        with open(self.ssh_config_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        # Find and update/create host block
-        host_block_start = -1
-        host_block_end = -1
-
-        for i, line in enumerate(lines):
-            if line.strip() == f"Host {self.host_alias}":
-                host_block_start = i
-                # Find end of this host block
-                for j in range(i + 1, len(lines)):
-                    stripped = lines[j].strip()
-                    # Stop at empty line, next Host block, or Match block
-                    if not stripped or stripped.startswith(("Host ", "Match ")):
-                        host_block_end = j
-                        break
-                else:
-                    host_block_end = len(lines)
-                break
-
-        # Prepare new host block
-        new_block = [
-            f"Host {self.host_alias}\n",
-            f"\tHostName {tunnel_info.hostname}\n",
-            f"\tPort {tunnel_info.port}\n",
-            f"\tUser {self.server_user}\n",
-            f"\tIdentityFile {self.private_key_path}\n",
-            f"\tPreferredAuthentications publickey\n",
-            f"\tStrictHostKeyChecking no\n",
-            f"\tUserKnownHostsFile /dev/null\n",
-            f"\tServerAliveInterval 30\n",
-            f"\tServerAliveCountMax 3\n",
-        ]
-
-        # Add port forwarding if specified
-        if ports:
-            for port in ports:
-                new_block.append(f"\tLocalForward {port} localhost:{port}\n")
-
-        # Update or append host block
-        if host_block_start >= 0:
-            lines[host_block_start:host_block_end] = new_block
+        # Locate the host block in one regex pass: the "Host <alias>" line
+        # plus following lines up to an empty line, the next Host/Match
+        # block, or end of file. A literal find first skips the regex when
+        # the alias is absent and otherwise starts it at the first candidate
+        # line instead of trying every line before it.
+        match = None
+        candidate = content.find(f"Host {self.host_alias}")
+        if candidate != -1:
+            line_start = content.rfind("\n", 0, candidate) + 1
+            match = _host_block_pattern(self.host_alias).search(content, line_start)
+
+        # Update or append host block; the new file is written as pieces so
+        # the full new content is never assembled in memory
+        if match:
+            unchanged = match.group(0) == new_block_text
+            pieces = (content[: match.start()], new_block_text, content[match.end() :])
         else:
-            # Append new block - add leading newline for separation if file is not empty
-            if lines and lines[-1].strip():
-                lines.append("\n")
-            lines.extend(new_block)
+            # Append new block - add leading newline for separation if the
+            # last line is not empty
+            last_line = content[content.rfind("\n", 0, len(content) - 1) + 1 :]
+            separator = "\n" if last_line.strip() else ""
+            unchanged = False
+            pieces = (content, separator, new_block_text)
+
+        if unchanged:
+            logger.debug(f"SSH config already up to date: {self.ssh_config_path}")
+        else:
+            self._replace_config(pieces)
+            logger.info(f"Updated SSH config: {self.ssh_config_path}")
+
+        self._write_config_stamp(new_block_text)
+
+    def _replace_config(self, pieces: Tuple[str, ...]) -> None:
+        """Write the SSH config to a temp file and atomically swap it in"""
+        # Follow a symlinked config (e.g. managed dotfiles) to the real file
+        target = self.ssh_config_path.resolve()
+        fd, tmp_path = tempfile.mkstemp(
+            dir=str(target.parent), prefix=".config.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines(pieces)
+            try:
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(target).st_mode))
+            except OSError:
+                pass
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
 
-        # Write updated config
-        with open(self.ssh_config_path, "w", encoding="utf-8") as f:
-            f.writelines(lines)
+    @property
+    def _config_stamp_path(self) -> Path:
+        """Stamp recording the last host block written for this alias"""
+        return self.ssh_config_path.parent / f".cpolar-cache-{self.host_alias}"
 
-        logger.info(f"Updated SSH config: {self.ssh_config_path}")
+    def _read_config_stamp(self) -> Optional[str]:
+        """
+        Return the host block recorded in the stamp file
+
+        The stamp stores the config file's mtime and size alongside the
+        block, so any edit to ~/.ssh/config since then invalidates it.
+        """
+        try:
+            st = self.ssh_config_path.stat()
+            signature, sep, block = self._config_stamp_path.read_text(
+                encoding="utf-8"
+            ).partition("\n")
+        except OSError:
+            return None
+        if signature != f"{st.st_mtime_ns}:{st.st_size}":
+            return None
+        return block
+
+    def _write_config_stamp(self, block: str) -> None:
+        """Record the host block now present in ~/.ssh/config (best effort)"""
+        try:
+            st = self.ssh_config_path.stat()
+            self._config_stamp_path.write_text(
+                f"{st.st_mtime_ns}:{st.st_size}\n{block}", encoding="utf-8"
+            )
+        except OSError as e:
+            logger.debug(f"Failed to write SSH config stamp: {e}")
 
     def connect(
         self,
         tunnel_info: Optional[TunnelInfo] = None,
         ports: Optional[List[int]] = None,
+        replace_process: bool = True,
     ) -> int:
         """
         Connect to server using SSH
@@ -309,9 +534,12 @@ class SSHManager:
         Args:
             tunnel_info: Optional TunnelInfo (uses config alias if not provided)
             ports: Optional list of ports to forward
+            replace_process: Replace the current process with ssh (POSIX
+                only); pass False when the caller needs the return code
 
         Returns:
-            SSH process return code
+            SSH process return code (when the process is replaced by ssh
+            this method does not return)
         """
         if tunnel_info:
             # Direct connection with tunnel info
@@ -342,7 +570,22 @@ class SSHManager:
             for port in ports:
                 ssh_command.extend(["-L", f"{port}:localhost:{port}"])
 
-        logger.info(f"Executing SSH command: {' '.join(ssh_command)}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Executing SSH command: %s", " ".join(ssh_command))
+
+        if replace_process and os.name != "nt":
+            # Replace this process with ssh so the interpreter and its
+            # libraries don't stay resident for the whole session. Nothing
+            # after exec runs, so flush output and logs first.
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for handler in logging.getLogger().handlers:
+                handler.flush()
+            try:
+                os.execvp("ssh", ssh_command)
+            except OSError as e:
+                logger.error(f"Failed to connect: {e}")
+                raise SSHError(_("error.ssh_connect_failed", error=e))
 
         try:
             # Use subprocess to maintain interactive session
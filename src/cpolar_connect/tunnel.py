@@ -2,24 +2,157 @@
 Tunnel management module for Cpolar Connect
 """
 
+import functools
 import logging
+import os
 import re
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-
-import requests
-from bs4 import BeautifulSoup
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Collection,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from .exceptions import NetworkError, TunnelError
 from .i18n import _
 
+if TYPE_CHECKING:
+    import requests
+
 logger = logging.getLogger(__name__)
 
+# tcp://host:port; the hostname class excludes ':' so matching never backtracks
+_TCP_URL_RE = re.compile(r"tcp://([a-zA-Z0-9.\-]+):(\d+)")
+
+# Unparseable status pages are dumped to the logs directory (DEBUG only) at
+# most once per this many seconds
+_DEBUG_DUMP_INTERVAL = 30.0
+_last_debug_dump: Optional[float] = None
+
+# Upper bound on the status page body read into memory; the real page is a
+# few KiB
+_MAX_STATUS_BYTES = 512 * 1024
+
+# "authtoken: <token>" as shown in the auth page's code/pre blocks
+_AUTHTOKEN_RE = re.compile(r"authtoken:\s*([a-zA-Z0-9_\-]+)")
+
+# One status table data row as the dashboard renders it: name <td>, URL
+# <th> (link-wrapped), region <td>, local address <td>. Every field is
+# [^<]* inside its own cell, so a match never spans rows.
+_STATUS_ROW_RE = re.compile(
+    r"<tr[^>]*>\s*"
+    r"<td[^>]*>\s*(?P<name>[^<]*?)\s*</td>\s*"
+    r"<th[^>]*>\s*(?:<a[^>]*>\s*)?(?P<url>tcp://[a-zA-Z0-9.\-]+:\d+)\s*"
+    r"(?:</a>\s*)?</th>\s*"
+    r"<td[^>]*>[^<]*</td>\s*"
+    r"<td[^>]*>\s*(?P<local>[^<]*?)\s*</td>"
+)
+# The same pattern over the undecoded page, as fetched
+_STATUS_ROW_BYTES_RE = re.compile(_STATUS_ROW_RE.pattern.encode("ascii"))
+
+
+class _StatusRowTarget:
+    """
+    lxml parser target picking the tunnel URL out of the status table
+
+    Rows are evaluated as their </tr> arrives, so no element tree is built.
+    Table structure: 隧道名称(td) | URL(th) | 地区(td) | 本地地址(td) | 创建时间(td)
+    The URL column is a <th scope="row">, so cells are td|th.
+    """
+
+    def __init__(self, skip_tunnels: Collection[str]):
+        self.skip_tunnels = skip_tunnels
+        self.ssh_url: Optional[str] = None  # first SSH tunnel (local port 22)
+        self.tcp_url: Optional[str] = None  # first other TCP tunnel
+        self._table_depth = 0
+        self._row: Optional[List[Tuple[str, List[str]]]] = None
+        self._cell: Optional[List[str]] = None
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        if tag == "table":
+            self._table_depth += 1
+        elif tag == "tr" and self._table_depth:
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+            self._row.append((tag, self._cell))
+
+    def data(self, text: str) -> None:
+        if self._cell is not None:
+            self._cell.append(text)
+
+    def end(self, tag: str) -> None:
+        if tag in ("td", "th"):
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            self._finish_row(self._row)
+            self._row = None
+        elif tag == "table" and self._table_depth:
+            self._table_depth -= 1
+
+    def _finish_row(self, row: List[Tuple[str, List[str]]]) -> None:
+        # Data rows start with a <td> (the header row is all <th>)
+        if self.ssh_url is not None or len(row) < 2 or row[0][0] != "td":
+            return
+        texts = ["".join(parts).strip() for _tag, parts in row]
+        tunnel_name, tunnel_url = texts[0], texts[1]
+        if not tunnel_url.startswith("tcp://"):
+            return
+
+        # Skip tunnels in the skip list
+        if tunnel_name in self.skip_tunnels:
+            logger.debug(f"Skipping tunnel: {tunnel_name}")
+            return
+
+        # Prefer SSH tunnel (local port 22)
+        if len(texts) >= 5 and ":22" in texts[3]:
+            logger.debug(
+                f"Found SSH tunnel via table: {tunnel_url} (name={tunnel_name})"
+            )
+            self.ssh_url = tunnel_url
+        elif self.tcp_url is None and _TCP_URL_RE.match(tunnel_url):
+            self.tcp_url = tunnel_url
+
+    def close(self) -> Optional[str]:
+        if self.ssh_url is None and self.tcp_url is not None:
+            logger.debug(f"Found TCP tunnel via table fallback: {self.tcp_url}")
+            return self.tcp_url
+        return self.ssh_url
+
+
+@functools.lru_cache(maxsize=None)
+def _authtoken_xpath():
+    """Compile the authtoken input XPath on first use"""
+    from lxml import etree
+
+    return etree.XPath('//input[@id="authtoken"]/@value')
+
+
+@functools.lru_cache(maxsize=None)
+def _authtoken_block_xpath():
+    """Compile the XPath for code/pre blocks mentioning authtoken on first use"""
+    from lxml import etree
+
+    return etree.XPath(
+        "//code[contains(., 'authtoken')] | //pre[contains(., 'authtoken')]"
+    )
+
 
 class TunnelInfo:
     """Data class for tunnel information"""
 
+    # Fixed attribute set: no per-instance __dict__
+    __slots__ = ("url", "hostname", "port", "name", "active")
+
     def __init__(self, url: str, hostname: str, port: int, name: str = "ssh"):
         self.url = url  # Full URL like tcp://xxx:port
         self.hostname = hostname
@@ -44,20 +177,55 @@ class TunnelInfo:
 class TunnelManager:
     """Manage cpolar tunnel information"""
 
+    # Tunnel names never picked as the SSH tunnel, as a set so each status
+    # row is checked with one hash lookup
+    skip_tunnels: FrozenSet[str] = frozenset({"remoteDesktop"})
+
     def __init__(
-        self, session: requests.Session, base_url: str = "https://dashboard.cpolar.com"
+        self,
+        session: "requests.Session",
+        base_url: str = "https://dashboard.cpolar.com",
+        skip_tunnels: Optional[Iterable[str]] = None,
     ):
         """
         Initialize tunnel manager with authenticated session
 
+        The session is used as is: the one returned by CpolarAuth.login()
+        comes from auth.create_session(), which already pools keep-alive
+        connections and retries gateway errors, and still holds the warm
+        TLS connection from logging in. Pass that same session rather than
+        creating one per operation; mounting a new adapter here would drop
+        its pooled connections.
+
         Args:
             session: Authenticated requests.Session from CpolarAuth
             base_url: Base URL for cpolar dashboard
+            skip_tunnels: Tunnel names to skip (default: remoteDesktop)
         """
+        if skip_tunnels is not None:
+            self.skip_tunnels = frozenset(skip_tunnels)
         self.session = session
         self.base_url = base_url
         self.status_url = f"{base_url}/status"
         self.auth_url = f"{base_url}/auth"
+        # Last parsed tunnel, tagged with its time.monotonic() fetch time
+        self._cache: Optional[Tuple[float, TunnelInfo]] = None
+        self.cache_ttl = 5.0
+        # Conditional request headers (If-None-Match/If-Modified-Since) and
+        # body of the last status page that carried validators
+        self._status_page: Optional[Tuple[Dict[str, str], bytes]] = None
+
+    def invalidate_cache(self) -> None:
+        """Forget the cached tunnel info so the next lookup re-fetches it"""
+        self._cache = None
+
+    def _cached_tunnel_info(self) -> Optional[TunnelInfo]:
+        """Return the cached tunnel info if it is younger than cache_ttl"""
+        if self._cache is not None:
+            fetched_at, tunnel_info = self._cache
+            if time.monotonic() - fetched_at < self.cache_ttl:
+                return tunnel_info
+        return None
 
     def get_tunnel_info(self) -> TunnelInfo:
         """
@@ -66,17 +234,17 @@ class TunnelManager:
         Returns:
             TunnelInfo object containing tunnel details
         """
-        try:
-            # Get status page
-            response = self.session.get(self.status_url, timeout=10)
-            response.raise_for_status()
+        # Calls in quick succession share one status fetch
+        tunnel_info = self._cached_tunnel_info()
+        if tunnel_info is not None:
+            logger.debug("Using cached tunnel info")
+            return tunnel_info
 
-            # Check if we're still authenticated
-            if "/login" in response.url:
-                raise TunnelError(_("error.session_expired"))
+        import requests
 
-            # Parse tunnel information
-            tunnel_url = self._parse_tunnel_url(response.text)
+        try:
+            # Get status page and parse tunnel information
+            tunnel_url = self._parse_tunnel_url(self._fetch_status_page())
 
             # Extract hostname and port
             hostname, port = self._extract_hostname_and_port(tunnel_url)
@@ -88,98 +256,174 @@ class TunnelManager:
 
             logger.info(f"Tunnel info: {tunnel_info}")
 
+            self._cache = (time.monotonic(), tunnel_info)
             return tunnel_info
 
         except requests.RequestException as e:
+            self.invalidate_cache()
             logger.error(f"Network error while fetching tunnel info: {e}")
             raise NetworkError(_("error.network", error=e))
         except TunnelError:
+            self.invalidate_cache()
             raise
         except Exception as e:
+            self.invalidate_cache()
             logger.error(f"Error getting tunnel info: {e}")
             raise TunnelError(_("error.tunnel", error=e))
 
+    def _fetch_status_page(self) -> bytes:
+        """
+        Fetch the status page body, reading at most _MAX_STATUS_BYTES
+
+        The body is streamed into one bounded buffer and left undecoded for
+        the parser. When the previous page carried an ETag or Last-Modified
+        header, the request is conditional and a 304 reuses the previous
+        body.
+
+        Returns:
+            Status page HTML as raw bytes
+
+        Raises:
+            TunnelError: If the session has expired
+        """
+        headers = self._status_page[0] if self._status_page is not None else {}
+        with self.session.get(
+            self.status_url, timeout=10, stream=True, headers=headers
+        ) as response:
+            if response.status_code == 304 and self._status_page is not None:
+                logger.debug("Status page not modified")
+                return self._status_page[1]
+            response.raise_for_status()
+
+            # Check if we're still authenticated
+            if "/login" in response.url:
+                raise TunnelError(_("error.session_expired"))
+
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body += chunk
+                if len(body) >= _MAX_STATUS_BYTES:
+                    logger.warning(
+                        f"Status page exceeds {_MAX_STATUS_BYTES} bytes, truncating"
+                    )
+                    del body[_MAX_STATUS_BYTES:]
+                    break
+
+            content = bytes(body)
+
+            validators = {}
+            if "ETag" in response.headers:
+                validators["If-None-Match"] = response.headers["ETag"]
+            if "Last-Modified" in response.headers:
+                validators["If-Modified-Since"] = response.headers["Last-Modified"]
+            self._status_page = (validators, content) if validators else None
+            return content
+
     def _parse_tunnel_url(
-        self, html_content: str, skip_tunnels: Optional[list] = None
+        self,
+        html_content: Union[bytes, str],
+        skip_tunnels: Optional[Collection[str]] = None,
     ) -> str:
         """
         Parse tunnel URL from status page HTML
 
         Args:
-            html_content: HTML content of status page
-            skip_tunnels: List of tunnel names to skip (default: ['remoteDesktop'])
+            html_content: HTML content of status page, raw (UTF-8) or decoded
+            skip_tunnels: Tunnel names to skip (default: self.skip_tunnels)
 
         Returns:
             Tunnel URL (e.g., "tcp://x.tcp.vip.cpolar.cn:12345")
         """
         if skip_tunnels is None:
-            skip_tunnels = ["remoteDesktop"]
-
-        soup = BeautifulSoup(html_content, "html.parser")
-        tcp_pattern = re.compile(r"tcp://[a-zA-Z0-9\.\-]+:\d+")
-
-        # Method 1: Parse table to find SSH tunnel (local port 22)
-        # Table structure: 隧道名称(td) | URL(th) | 地区(td) | 本地地址(td) | 创建时间(td)
-        # Note: URL column uses <th scope="row"> instead of <td>
-        tables = soup.find_all("table")
-        for table in tables:
-            rows = table.find_all("tr")
-            for row in rows:
-                # Get all cells (both td and th)
-                all_cells = row.find_all(["td", "th"])
-                # Skip header row (all th)
-                if len(all_cells) >= 5 and all_cells[0].name == "td":
-                    tunnel_name = all_cells[0].get_text(strip=True)
-                    tunnel_url = all_cells[1].get_text(strip=True)
-                    local_addr = all_cells[3].get_text(strip=True)
-
-                    # Skip tunnels in the skip list
-                    if tunnel_name in skip_tunnels:
-                        logger.debug(f"Skipping tunnel: {tunnel_name}")
-                        continue
-
-                    # Prefer SSH tunnel (local port 22)
-                    if tunnel_url.startswith("tcp://") and ":22" in local_addr:
-                        logger.debug(
-                            f"Found SSH tunnel via table: {tunnel_url} (name={tunnel_name})"
-                        )
-                        return tunnel_url
-
-        # Method 2: Fallback - find any TCP tunnel not in skip list
-        for table in tables:
-            rows = table.find_all("tr")
-            for row in rows:
-                all_cells = row.find_all(["td", "th"])
-                if len(all_cells) >= 2 and all_cells[0].name == "td":
-                    tunnel_name = all_cells[0].get_text(strip=True)
-                    tunnel_url = all_cells[1].get_text(strip=True)
-
-                    if tunnel_name in skip_tunnels:
-                        continue
-
-                    if tunnel_url.startswith("tcp://") and tcp_pattern.match(
-                        tunnel_url
-                    ):
-                        logger.debug(
-                            f"Found TCP tunnel via table fallback: {tunnel_url}"
-                        )
-                        return tunnel_url
-
-        # Save page content for debugging to logs directory
+            skip_tunnels = self.skip_tunnels
+
+        # Fast path: a single regex scan yields name, URL and local address
+        # for every row in the page as rendered, without building a DOM.
+        # The TCP fallback is only trusted when no data cell (<td>) lies
+        # outside the matched rows; otherwise the parser below decides.
+        # Raw pages are scanned as bytes and only the matched fields decoded
+        raw = isinstance(html_content, bytes)
+        if raw:
+            row_re, td, tr_end = _STATUS_ROW_BYTES_RE, b"<td", b"</tr>"
+        else:
+            row_re, td, tr_end = _STATUS_ROW_RE, "<td", "</tr>"
+        tcp_url = None
+        unmatched = False
+        pos = 0
+        for row in row_re.finditer(html_content):
+            unmatched = unmatched or html_content.find(td, pos, row.start()) != -1
+            # Trailing cells (creation time) are not part of the match
+            pos = html_content.find(tr_end, row.end())
+            pos = row.end() if pos == -1 else pos
+            name, url, local = row.group("name", "url", "local")
+            if raw:
+                name = name.decode("utf-8", "replace")
+                url = url.decode("ascii")
+                local = local.decode("utf-8", "replace")
+            if name in skip_tunnels:
+                continue
+            if ":22" in local:
+                logger.debug(f"Found SSH tunnel via row scan: {url} (name={name})")
+                return url
+            if tcp_url is None:
+                tcp_url = url
+        if tcp_url is not None and not unmatched and html_content.find(td, pos) == -1:
+            logger.debug(f"Found TCP tunnel via row scan fallback: {tcp_url}")
+            return tcp_url
+
+        from lxml import etree
+
+        # Stream the page through a parser target: the fallback to any TCP
+        # tunnel is tracked in the same pass. The dashboard serves UTF-8;
+        # raw pages are decoded by libxml2 itself
+        parser = etree.HTMLParser(
+            target=_StatusRowTarget(skip_tunnels), encoding="utf-8" if raw else None
+        )
+        tunnel_url = etree.fromstring(html_content, parser)
+        if tunnel_url is not None:
+            return tunnel_url
+
+        self._dump_status_page(html_content)
+
+        logger.error("Could not find tunnel URL in status page")
+        raise TunnelError(_("tunnel.not_found"))
+
+    def _dump_status_page(self, html_content: Union[bytes, str]) -> None:
+        """
+        Save an unparseable status page to the logs directory
+
+        Only with DEBUG logging enabled, and at most once per
+        _DEBUG_DUMP_INTERVAL seconds, so retries don't repeat the write.
+        """
+        global _last_debug_dump
+
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        now = time.monotonic()
+        if (
+            _last_debug_dump is not None
+            and now - _last_debug_dump < _DEBUG_DUMP_INTERVAL
+        ):
+            return
+        _last_debug_dump = now
+
         try:
             log_dir = Path.home() / ".cpolar_connect" / "logs"
             log_dir.mkdir(parents=True, exist_ok=True)
             ts = datetime.now().strftime("%Y%m%d-%H%M%S")
             debug_path = log_dir / f"tunnel_status_debug_{ts}.html"
-            with open(debug_path, "w", encoding="utf-8") as f:
-                f.write(html_content)
+            fd = os.open(debug_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                if isinstance(html_content, str):
+                    html_content = html_content.encode("utf-8")
+                os.write(fd, html_content)
+            finally:
+                os.close(fd)
+            logger.debug(f"Saved status page to {debug_path}")
         except Exception:
             # Best-effort; ignore file errors
             pass
 
-        logger.error("Could not find tunnel URL in status page")
-        raise TunnelError(_("tunnel.not_found"))
-
     def _extract_hostname_and_port(self, tunnel_url: str) -> Tuple[str, int]:
         """
         Extract hostname and port from tunnel URL.
@@ -190,12 +434,11 @@ class TunnelManager:
         Returns:
             Tuple of (hostname, port)
         """
-        pattern = r"^tcp://([a-zA-Z0-9\.\-]+):(\d+)$"
-        match = re.match(pattern, tunnel_url)
+        match = _TCP_URL_RE.fullmatch(tunnel_url)
 
         if match:
-            hostname = match.group(1)
-            port = int(match.group(2))
+            hostname, port_text = match.groups()
+            port = int(port_text)
             logger.debug(f"Extracted hostname={hostname}, port={port}")
             return hostname, port
 
@@ -209,31 +452,29 @@ class TunnelManager:
         Returns:
             Auth token string or None if not found
         """
+        from lxml import html as lxml_html
+
         try:
             response = self.session.get(self.auth_url, timeout=10)
             response.raise_for_status()
 
-            soup = BeautifulSoup(response.text, "html.parser")
+            root = lxml_html.fromstring(response.content)
 
             # Look for authtoken input field
-            authtoken_input = soup.find("input", {"id": "authtoken"})
-            if authtoken_input:
-                token = authtoken_input.get("value", "").strip()
+            values = _authtoken_xpath()(root)
+            if values:
+                token = values[0].strip()
                 if token:
                     logger.debug("Successfully obtained auth token")
                     return token
 
-            # Alternative: look for token in different places
-            # Sometimes it might be in a code block or pre tag
-            for element in soup.find_all(["code", "pre"]):
-                text = element.text.strip()
-                if text.startswith("authtoken:") or "authtoken" in text:
-                    # Extract token from text
-                    token_match = re.search(r"authtoken:\s*([a-zA-Z0-9_\-]+)", text)
-                    if token_match:
-                        token = token_match.group(1)
-                        logger.debug("Found auth token in code block")
-                        return token
+            # Alternative: the token may be shown in a code block or pre
+            # tag; libxml2 filters the blocks that mention it
+            for element in _authtoken_block_xpath()(root):
+                token_match = _AUTHTOKEN_RE.search(element.text_content())
+                if token_match:
+                    logger.debug("Found auth token in code block")
+                    return token_match.group(1)
 
             logger.warning("Auth token not found on auth page")
             return None
@@ -264,13 +505,15 @@ class TunnelManager:
         Returns:
             True if tunnel is active, False otherwise
         """
-        try:
-            # Re-fetch status page
-            response = self.session.get(self.status_url, timeout=10)
-            response.raise_for_status()
+        # The tunnel was on a status page fetched moments ago; any other URL
+        # still needs the full page, which lists every tunnel
+        cached = self._cached_tunnel_info()
+        if cached is not None and cached.url == tunnel_info.url:
+            return True
 
-            # Check if tunnel URL is still present
-            return tunnel_info.url in response.text
+        try:
+            # Re-fetch status page and check the tunnel URL is still present
+            return tunnel_info.url.encode("ascii") in self._fetch_status_page()
 
         except Exception as e:
             logger.error(f"Error verifying tunnel: {e}")
@@ -84,7 +84,7 @@ def sample_status_html_only_remote_desktop():
 '''
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_login_form_html():
     """Real cpolar login form HTML."""
     return '''
@@ -117,6 +117,15 @@ def sample_login_form_html():
 '''
 
 
+@pytest.fixture(scope="session")
+def parsed_login_form(sample_login_form_html):
+    """Login form parsed once for the whole session (read-only), with the
+    same lxml parser extract_csrf_token uses."""
+    from lxml import html as lxml_html
+
+    return lxml_html.fromstring(sample_login_form_html)
+
+
 @pytest.fixture
 def sample_login_success_html():
     """Real cpolar page after successful login (get-started page)."""
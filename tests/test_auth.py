@@ -3,35 +3,36 @@ Tests for auth.py - CSRF extraction and login verification.
 """
 
 import pytest
-from unittest.mock import Mock
-from bs4 import BeautifulSoup
-from cpolar_connect.auth import CpolarAuth
+from unittest.mock import MagicMock, Mock
+from lxml import html as lxml_html
+from cpolar_connect.auth import CpolarAuth, _csrf_xpaths, create_session, extract_csrf_token
+
+LOGIN_URL = "https://dashboard.cpolar.com/login"
 
 
 class TestCsrfExtraction:
     """Test CSRF token extraction from login page."""
 
-    def test_extract_csrf_from_hidden_input(self, sample_login_form_html):
+    def test_extract_csrf_from_hidden_input(self, parsed_login_form):
         """Should extract CSRF token from hidden input field."""
-        soup = BeautifulSoup(sample_login_form_html, 'html.parser')
-        csrf_input = soup.find("input", {"name": "csrf_token"})
-        assert csrf_input is not None
-        token = csrf_input.get("value")
+        input_xpath, _meta_xpath = _csrf_xpaths()
+        csrf_inputs = input_xpath(parsed_login_form)
+        assert csrf_inputs
+        token = csrf_inputs[0].get("value")
         assert token == "1538662349.68##b5aa35f374452a6198004dab20d88b13583c7c2c"
 
     def test_extract_csrf_from_meta_tag(self):
         """Should extract CSRF token from meta tag as fallback."""
         html = '<html><head><meta name="csrf-token" content="meta_token_123"></head></html>'
-        soup = BeautifulSoup(html, 'html.parser')
-        meta = soup.find("meta", {"name": "csrf-token"})
-        assert meta is not None
-        assert meta.get("content") == "meta_token_123"
+        _input_xpath, meta_xpath = _csrf_xpaths()
+        meta = meta_xpath(lxml_html.fromstring(html))
+        assert meta
+        assert meta[0].get("content") == "meta_token_123"
 
-    def test_csrf_token_format(self, sample_login_form_html):
+    def test_csrf_token_format(self, parsed_login_form):
         """CSRF token should have expected format (timestamp##hash)."""
-        soup = BeautifulSoup(sample_login_form_html, 'html.parser')
-        csrf_input = soup.find("input", {"name": "csrf_token"})
-        token = csrf_input.get("value")
+        input_xpath, _meta_xpath = _csrf_xpaths()
+        token = input_xpath(parsed_login_form)[0].get("value")
         # Token format: timestamp##hash
         assert "##" in token
         parts = token.split("##")
@@ -41,38 +42,113 @@ class TestCsrfExtraction:
 class TestLoginVerification:
     """Test login success/failure verification logic."""
 
-    def test_verify_success_redirect_away_from_login(self):
-        """Should detect success when redirected away from /login."""
+    @staticmethod
+    def _verify(url, location=None, landing=None):
+        """Run _verify_authentication on a login POST response."""
         mock_response = Mock()
-        mock_response.url = "https://dashboard.cpolar.com/get-started"
+        mock_response.url = url
+        mock_response.is_redirect = location is not None
+        mock_response.headers = {"Location": location} if location else {}
 
         auth = CpolarAuth.__new__(CpolarAuth)
-        result = auth._verify_authentication(mock_response)
+        auth.session = Mock()
+        if landing is not None:
+            page = MagicMock(url=landing)
+            page.__enter__.return_value = page
+            page.iter_content.return_value = iter([])
+            auth.session.get.return_value = page
+        return auth._verify_authentication(mock_response), auth.session
+
+    def test_verify_success_redirect_away_from_login(self):
+        """Should detect success when redirected away from /login."""
+        result, _session = self._verify("https://dashboard.cpolar.com/get-started")
         assert result is True
 
     def test_verify_success_redirect_to_status(self):
         """Should detect success when redirected to status page."""
-        mock_response = Mock()
-        mock_response.url = "https://dashboard.cpolar.com/status"
-
-        auth = CpolarAuth.__new__(CpolarAuth)
-        result = auth._verify_authentication(mock_response)
+        result, _session = self._verify("https://dashboard.cpolar.com/status")
         assert result is True
 
     def test_verify_success_redirect_to_dashboard(self):
         """Should detect success when redirected to dashboard page."""
-        mock_response = Mock()
-        mock_response.url = "https://dashboard.cpolar.com/dashboard"
-
-        auth = CpolarAuth.__new__(CpolarAuth)
-        result = auth._verify_authentication(mock_response)
+        result, _session = self._verify("https://dashboard.cpolar.com/dashboard")
         assert result is True
 
     def test_verify_failure_still_on_login_page(self):
         """Should detect failure when still on login page."""
-        mock_response = Mock()
-        mock_response.url = "https://dashboard.cpolar.com/login"
+        result, _session = self._verify("https://dashboard.cpolar.com/login")
+        assert result is False
 
-        auth = CpolarAuth.__new__(CpolarAuth)
-        result = auth._verify_authentication(mock_response)
+    def test_verify_success_from_redirect_location(self):
+        """Should judge an unfollowed redirect by its Location header."""
+        result, session = self._verify(LOGIN_URL, location="/get-started")
+        assert result is True
+        session.get.assert_not_called()
+
+    def test_verify_failure_redirect_back_to_login(self):
+        """Should detect failure when redirected back to /login."""
+        result, _session = self._verify(LOGIN_URL, location=LOGIN_URL)
         assert result is False
+
+    def test_verify_failure_redirect_without_location(self):
+        """Should detect failure when a redirect has no Location header."""
+        # requests does not count a 3xx without Location as a redirect
+        result, _session = self._verify(LOGIN_URL)
+        assert result is False
+
+    def test_verify_follows_inconclusive_redirect(self):
+        """Should follow a redirect to "/" and fail if it lands on /login."""
+        result, session = self._verify(LOGIN_URL, location="/", landing=LOGIN_URL)
+        assert result is False
+        session.get.assert_called_once_with(
+            "https://dashboard.cpolar.com/", timeout=10, stream=True
+        )
+
+
+class TestGetCsrfToken:
+    """Test CpolarAuth.get_csrf_token against real login page HTML."""
+
+    def _auth_with_page(self, html):
+        auth = CpolarAuth.__new__(CpolarAuth)
+        auth.login_url = "https://dashboard.cpolar.com/login"
+        auth.session = Mock()
+        auth.session.get.return_value = Mock(content=html.encode("utf-8"))
+        return auth
+
+    def test_get_csrf_token_from_hidden_input(self, sample_login_form_html):
+        """Should return the hidden input value from the login form."""
+        auth = self._auth_with_page(sample_login_form_html)
+        token = auth.get_csrf_token()
+        assert token == "1538662349.68##b5aa35f374452a6198004dab20d88b13583c7c2c"
+
+    def test_get_csrf_token_from_meta_tag(self):
+        """Should fall back to the csrf-token meta tag."""
+        html = '<html><head><meta name="csrf-token" content="meta_token_123"></head></html>'
+        auth = self._auth_with_page(html)
+        assert auth.get_csrf_token() == "meta_token_123"
+
+    def test_extract_csrf_token_missing(self):
+        """Should return None when the page has no token."""
+        assert extract_csrf_token(b"<html><body><form></form></body></html>") is None
+
+    @pytest.mark.parametrize("content", [b"", b"   \n"])
+    def test_extract_csrf_token_blank_page(self, content):
+        """Should return None instead of raising for a blank page."""
+        assert extract_csrf_token(content) is None
+
+    def test_extract_csrf_token_falls_back_for_entities(self):
+        """Should decode entity-escaped values via the full parser."""
+        html = b'<form><input type="hidden" name="csrf_token" value="a&amp;b"></form>'
+        assert extract_csrf_token(html) == "a&b"
+
+
+class TestCreateSession:
+    """Test the shared dashboard session setup."""
+
+    def test_accepts_only_decodable_encodings(self):
+        """Should advertise gzip, and br only when a decoder is installed."""
+        from urllib3.util.request import ACCEPT_ENCODING
+
+        encodings = create_session().headers["Accept-Encoding"]
+        assert encodings == ACCEPT_ENCODING
+        assert "gzip" in encodings
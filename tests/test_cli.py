@@ -0,0 +1,41 @@
+"""
+Tests for cli.py - helpers of the connect flow.
+"""
+
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from cpolar_connect import cli as cli_module
+from cpolar_connect.prompts import Prompts
+
+
+class TestDiscardBackgroundKey:
+    """Test cleanup of a key pair generated for a cancelled first connect."""
+
+    @staticmethod
+    def _discard(tmp_path, result=None, error=None):
+        ssh_manager = SimpleNamespace(
+            private_key_path=tmp_path / "id_rsa_cpolar",
+            public_key_path=tmp_path / "id_rsa_cpolar.pub",
+        )
+        ssh_manager.private_key_path.write_text("key")
+        ssh_manager.public_key_path.write_text("pub")
+        future = Future()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        cli_module._discard_background_key(Prompts(quiet=True), ssh_manager, future)
+        return ssh_manager
+
+    def test_removes_generated_key_pair(self, tmp_path):
+        """Should wait for the job and delete the keys it wrote."""
+        ssh_manager = self._discard(tmp_path, result=True)
+        assert not ssh_manager.private_key_path.exists()
+        assert not ssh_manager.public_key_path.exists()
+
+    def test_removes_half_written_keys_after_failure(self, tmp_path):
+        """Should also clean up when key generation raised."""
+        ssh_manager = self._discard(tmp_path, error=OSError("disk full"))
+        assert not ssh_manager.private_key_path.exists()
+        assert not ssh_manager.public_key_path.exists()
@@ -4,6 +4,7 @@ from pathlib import Path
 import pytest
 
 from cpolar_connect.config import ConfigManager
+from cpolar_connect.exceptions import ConfigError
 
 
 def test_config_set_and_get_ports_and_flags(monkeypatch, tmp_path: Path):
@@ -35,3 +36,29 @@ def test_config_set_and_get_ports_and_flags(monkeypatch, tmp_path: Path):
     cm.set("log_level", "debug")
     assert cm.get("log_level") == "DEBUG"
 
+    # Key type normalization and validation
+    assert cm.get("ssh.key_type") == "ed25519"
+    cm.set("ssh.key_type", "RSA")
+    assert cm.get("ssh.key_type") == "rsa"
+    with pytest.raises(ConfigError):
+        cm.set("ssh.key_type", "dsa")
+
+
+
+def test_password_file_read_once_and_refreshed_on_change(monkeypatch, tmp_path: Path):
+    monkeypatch.delenv("CPOLAR_PASSWORD", raising=False)
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+
+    cm = ConfigManager()
+    cm.set_password("user@example.com", "first")
+    assert cm.get_password("user@example.com") == "first"
+
+    # Later lookups are served from memory
+    cm.password_file.write_text("edited", encoding="utf-8")
+    assert cm.get_password("user@example.com") == "first"
+
+    # Storing or clearing through the manager refreshes the cached value
+    cm.set_password("user@example.com", "second")
+    assert cm.get_password("user@example.com") == "second"
+    assert cm.clear_password("user@example.com") is True
+    assert cm.get_password("user@example.com") is None
@@ -0,0 +1,108 @@
+"""
+Tests for prompts.py - input retry, password reading and color output.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+from cpolar_connect.prompts import Prompts, _read_password, create_console
+
+
+def _feed(monkeypatch, answers):
+    replies = iter(answers)
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(replies))
+
+
+class TestRetries:
+    """Invalid input is re-prompted without recursing."""
+
+    def test_text_required_reprompts_until_answered(self, monkeypatch):
+        """Should keep asking while a required field is left empty."""
+        _feed(monkeypatch, ["", "  ", "ubuntu"])
+        assert Prompts().text("User", required=True) == "ubuntu"
+
+    def test_select_reprompts_on_out_of_range(self, monkeypatch, capsys):
+        """Should warn and ask again for an invalid choice number."""
+        _feed(monkeypatch, ["9", "x", "2"])
+        choices = [{"value": "zh"}, {"value": "en"}]
+        assert Prompts().select("Language", choices) == "en"
+        assert capsys.readouterr().out.count("Please enter a number") == 2
+
+
+@pytest.mark.skipif(os.name == "nt", reason="needs a POSIX pseudo-terminal")
+class TestReadPassword:
+    """Test the no-echo terminal reader behind Prompts.password."""
+
+    @staticmethod
+    def _read(typed: bytes) -> str:
+        import pty
+
+        master, slave = pty.openpty()
+
+        def type_after_prompt():
+            # Input typed before the prompt is flushed, like getpass does
+            seen = b""
+            while b"Password: " not in seen:
+                seen += os.read(master, 1024)
+            os.write(master, typed)
+
+        typist = threading.Thread(target=type_after_prompt, daemon=True)
+        typist.start()
+        try:
+            return _read_password(slave, "Password: ")
+        finally:
+            typist.join(timeout=5)
+            os.close(master)
+            os.close(slave)
+
+    def test_reads_lines_longer_than_max_canon(self):
+        """Should return the full line, well past the 1024-byte canonical limit."""
+        secret = "x" * 3000
+        assert self._read(secret.encode() + b"\r") == secret
+
+    def test_backspace_removes_whole_characters(self):
+        """Should drop a multi-byte character with a single backspace."""
+        assert self._read("pa密\x7fss\n".encode()) == "pass"
+
+    def test_ctrl_d_on_empty_line_raises_eof(self):
+        """Should treat Ctrl-D on an empty line as end of input."""
+        with pytest.raises(EOFError):
+            self._read(b"\x04")
+
+
+class TestColor:
+    """ANSI styling is used only on an interactive stdout."""
+
+    def test_piped_output_has_no_escape_codes(self, capsys):
+        """Should print the bare symbols when stdout is not a terminal."""
+        p = Prompts()
+        p.intro("Setup")
+        p.step("Login", status="done")
+        p.log_success("Connected")
+        out = capsys.readouterr().out
+        assert "\x1b[" not in out
+        assert "┌ Setup" in out
+        assert "●  Login" in out
+        assert "│  ✓ Connected" in out
+
+    def test_tty_output_is_colored_unless_no_color(self, monkeypatch, capsys):
+        """Should color a terminal, and honour NO_COLOR."""
+        monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+        monkeypatch.delenv("NO_COLOR", raising=False)
+        Prompts().log_success("Connected")
+        assert "\x1b[32m✓\x1b[0m" in capsys.readouterr().out
+
+        monkeypatch.setenv("NO_COLOR", "1")
+        Prompts().log_success("Connected")
+        assert "\x1b[" not in capsys.readouterr().out
+
+    def test_console_highlights_only_a_terminal(self, monkeypatch):
+        """Should skip rich's repr highlighting for redirected output."""
+        monkeypatch.delenv("NO_COLOR", raising=False)
+        assert not create_console().render_str("port 8080").spans
+
+        monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+        assert create_console().render_str("port 8080").spans
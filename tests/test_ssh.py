@@ -0,0 +1,358 @@
+"""
+Tests for ssh.py - connection pooling and SSH config updates.
+"""
+
+import os
+import shlex
+import stat
+import subprocess
+from unittest.mock import MagicMock, Mock
+
+import paramiko
+import pytest
+
+from cpolar_connect import ssh as ssh_module
+from cpolar_connect.config import CpolarConfig
+from cpolar_connect.ssh import SSHManager
+from cpolar_connect.tunnel import TunnelInfo
+
+
+class TestOpenSSH:
+    """Test connecting and re-authenticating SSH clients."""
+
+    def test_password_auth_on_open_transport(self):
+        """Should authenticate an open, unauthenticated transport in place."""
+        client = Mock()
+        transport = client.get_transport.return_value
+        transport.is_active.return_value = True
+        result = ssh_module._open_ssh("host", 22, "user", password="pw", client=client)
+        assert result is client
+        transport.auth_password.assert_called_once_with("user", "pw")
+        client.connect.assert_not_called()
+
+    def test_fresh_connection_offers_only_given_credentials(self, monkeypatch):
+        """Should connect a new client without agent or default keys."""
+        client = MagicMock()
+        monkeypatch.setattr(paramiko, "SSHClient", lambda: client)
+        assert ssh_module._open_ssh("host", 22, "user", password="pw") is client
+        kwargs = client.connect.call_args.kwargs
+        assert kwargs["allow_agent"] is False and kwargs["look_for_keys"] is False
+
+
+@pytest.fixture
+def ssh_manager(tmp_path):
+    """SSHManager writing to a temporary ~/.ssh/config."""
+    config = CpolarConfig(username="user@example.com", server_user="ubuntu")
+    manager = SSHManager(config)
+    manager.ssh_dir = tmp_path
+    manager.private_key_path = tmp_path / "id_rsa_cpolar"
+    manager.public_key_path = tmp_path / "id_rsa_cpolar.pub"
+    manager.ssh_config_path = tmp_path / ".ssh" / "config"
+    return manager
+
+
+TUNNEL = TunnelInfo(
+    url="tcp://7.tcp.vip.cpolar.cn:12766", hostname="7.tcp.vip.cpolar.cn", port=12766
+)
+
+
+class TestUpdateSSHConfig:
+    """Test host block updates in ~/.ssh/config."""
+
+    def test_creates_config_with_host_block(self, ssh_manager):
+        """Should create the config file and append the host block."""
+        ssh_manager.update_ssh_config(TUNNEL, [8888])
+        content = ssh_manager.ssh_config_path.read_text(encoding="utf-8")
+        assert "Host cpolar-server\n" in content
+        assert "\tHostName 7.tcp.vip.cpolar.cn\n" in content
+        assert "\tPort 12766\n" in content
+        assert "\tLocalForward 8888 localhost:8888\n" in content
+        assert content.startswith("# SSH config file\n")
+        assert stat.S_IMODE(ssh_manager.ssh_config_path.stat().st_mode) == 0o600
+
+    def test_replaces_existing_block_and_keeps_neighbours(self, ssh_manager):
+        """Should replace only the alias block, keeping other Host/Match blocks."""
+        ssh_manager.ssh_config_path.parent.mkdir(parents=True)
+        ssh_manager.ssh_config_path.write_text(
+            "Host other\n\tHostName other.example.com\n\n"
+            "Host cpolar-server\n\tHostName old.host\n\tPort 1\n"
+            "Match host foo\n\tUser bar\n",
+            encoding="utf-8",
+        )
+        ssh_manager.update_ssh_config(TUNNEL)
+        content = ssh_manager.ssh_config_path.read_text(encoding="utf-8")
+        assert content.startswith("Host other\n\tHostName other.example.com\n\n")
+        assert "old.host" not in content
+        assert "\tPort 12766\n" in content
+        assert content.endswith("Match host foo\n\tUser bar\n")
+        assert content.count("Host cpolar-server") == 1
+
+    def test_skips_lookalike_lines_before_the_block(self, ssh_manager):
+        """Should match the real header, not earlier lines containing the alias."""
+        ssh_manager.ssh_config_path.parent.mkdir(parents=True)
+        ssh_manager.ssh_config_path.write_text(
+            "# Host cpolar-server is managed by cpolar-connect\n"
+            "Host cpolar-server-old\n\tHostName keep.host\n\n"
+            "Host cpolar-server\n\tHostName old.host\n",
+            encoding="utf-8",
+        )
+        ssh_manager.update_ssh_config(TUNNEL)
+        content = ssh_manager.ssh_config_path.read_text(encoding="utf-8")
+        assert "keep.host" in content
+        assert "old.host" not in content
+        assert content.count("\tHostName 7.tcp.vip.cpolar.cn\n") == 1
+
+    def test_unchanged_config_is_not_rewritten(self, ssh_manager):
+        """Should skip the write when the block is already up to date."""
+        ssh_manager.update_ssh_config(TUNNEL, [8888])
+        path = ssh_manager.ssh_config_path
+        before = path.read_text(encoding="utf-8")
+        os.utime(path, ns=(0, 0))
+        ssh_manager.update_ssh_config(TUNNEL, [8888])
+        assert path.read_text(encoding="utf-8") == before
+        assert path.stat().st_mtime_ns == 0
+
+    def test_external_edit_invalidates_stamp(self, ssh_manager):
+        """Should rewrite the block when the config changed after the last update."""
+        ssh_manager.update_ssh_config(TUNNEL)
+        path = ssh_manager.ssh_config_path
+        path.write_text("# edited by hand\n", encoding="utf-8")
+        ssh_manager.update_ssh_config(TUNNEL)
+        content = path.read_text(encoding="utf-8")
+        assert content.startswith("# edited by hand\n\nHost cpolar-server\n")
+
+    def test_symlinked_config_is_updated_in_place(self, ssh_manager, tmp_path):
+        """Should write through a symlinked config instead of replacing the link."""
+        real = tmp_path / "dotfiles" / "ssh_config"
+        real.parent.mkdir()
+        real.write_text("Host other\n\tHostName other.example.com\n", encoding="utf-8")
+        ssh_manager.ssh_config_path.parent.mkdir(parents=True)
+        ssh_manager.ssh_config_path.symlink_to(real)
+
+        ssh_manager.update_ssh_config(TUNNEL)
+
+        assert ssh_manager.ssh_config_path.is_symlink()
+        assert "Host cpolar-server\n" in real.read_text(encoding="utf-8")
+        assert not list(real.parent.glob(".config.*.tmp"))
+
+
+class TestUploadPublicKey:
+    """Test key probing and duplicate detection in upload_public_key."""
+
+    @pytest.fixture(autouse=True)
+    def fake_key(self, monkeypatch):
+        monkeypatch.setattr(paramiko.PKey, "from_path", lambda path: Mock())
+
+    @staticmethod
+    def _upload(
+        ssh_manager,
+        tmp_path,
+        monkeypatch,
+        existing=None,
+        key_accepted=False,
+        public_key=b"ssh-rsa AAAA cpolar-connect\n",
+        check_client=None,
+    ):
+        ssh_manager.private_key_path.write_bytes(b"private key")
+        ssh_manager.public_key_path.write_bytes(public_key)
+
+        # The first client probes the key; a rejection leaves its transport
+        # open for the password. Later clients (the post-upload key check)
+        # succeed unless check_client says otherwise.
+        client = MagicMock()
+        transport = client.get_transport.return_value
+        transport.is_active.side_effect = [False, True]
+        if not key_accepted:
+            client.connect.side_effect = paramiko.AuthenticationException
+        clients = iter([client])
+        monkeypatch.setattr(
+            paramiko,
+            "SSHClient",
+            lambda: next(clients, None) or check_client or MagicMock(),
+        )
+
+        # Run the remote command with sh against a throwaway home directory
+        home = tmp_path / "remote"
+        authorized_keys = home / ".ssh" / "authorized_keys"
+        if existing is not None:
+            authorized_keys.parent.mkdir(parents=True)
+            authorized_keys.write_bytes(existing)
+
+        def exec_command(command):
+            proc = subprocess.run(
+                ["sh", "-c", command],
+                capture_output=True,
+                cwd=tmp_path,
+                env={**os.environ, "HOME": str(home)},
+            )
+            stdout = Mock()
+            stdout.channel.recv_exit_status.return_value = proc.returncode
+            stdout.read.return_value = proc.stdout
+            return Mock(), stdout, Mock(read=Mock(return_value=proc.stderr))
+
+        client.exec_command.side_effect = exec_command
+        result = ssh_manager.upload_public_key("host", 22, "pw")
+        client.close.assert_called()
+        return result, client, authorized_keys
+
+    def test_accepted_key_skips_upload(self, ssh_manager, tmp_path, monkeypatch):
+        """Should report the key as verified without touching authorized_keys."""
+        result, client, authorized_keys = self._upload(
+            ssh_manager, tmp_path, monkeypatch, key_accepted=True
+        )
+        assert result == (False, True)
+        client.get_transport.return_value.auth_password.assert_not_called()
+        assert not authorized_keys.exists()
+
+    def test_existing_key_is_not_appended(self, ssh_manager, tmp_path, monkeypatch):
+        """Should match the key as a whole line, even without a trailing newline."""
+        existing = b"ssh-ed25519 BBBB other\nssh-rsa AAAA cpolar-connect"
+        result, client, authorized_keys = self._upload(
+            ssh_manager, tmp_path, monkeypatch, existing
+        )
+        assert result == (False, False)
+        client.get_transport.return_value.auth_password.assert_called_once_with(
+            "ubuntu", "pw"
+        )
+        assert authorized_keys.read_bytes() == existing
+
+    def test_missing_key_is_appended_on_new_line(
+        self, ssh_manager, tmp_path, monkeypatch
+    ):
+        """Should append the key, terminating an unterminated last line first."""
+        result, _client, authorized_keys = self._upload(
+            ssh_manager, tmp_path, monkeypatch, b"ssh-rsa AAAA cpolar-connect-old"
+        )
+        assert result == (True, True)
+        assert authorized_keys.read_bytes() == (
+            b"ssh-rsa AAAA cpolar-connect-old\nssh-rsa AAAA cpolar-connect\n"
+        )
+
+    def test_creates_authorized_keys_with_private_modes(
+        self, ssh_manager, tmp_path, monkeypatch
+    ):
+        """Should create ~/.ssh and authorized_keys when missing."""
+        result, _client, authorized_keys = self._upload(
+            ssh_manager, tmp_path, monkeypatch
+        )
+        assert result == (True, True)
+        assert authorized_keys.read_bytes() == b"ssh-rsa AAAA cpolar-connect\n"
+        assert stat.S_IMODE(authorized_keys.stat().st_mode) == 0o600
+        assert stat.S_IMODE(authorized_keys.parent.stat().st_mode) == 0o700
+
+    def test_key_is_appended_literally_in_one_command(
+        self, ssh_manager, tmp_path, monkeypatch
+    ):
+        """Should pass shell metacharacters through and use a single channel."""
+        public_key = b"ssh-rsa AAAA it's $(touch pwned) `touch pwned` \\n"
+        result, client, authorized_keys = self._upload(
+            ssh_manager, tmp_path, monkeypatch, public_key=public_key + b"\n"
+        )
+        assert result == (True, True)
+        assert client.exec_command.call_count == 1
+        assert authorized_keys.read_bytes() == public_key + b"\n"
+        assert not any(tmp_path.rglob("pwned"))
+
+    def test_script_runs_under_sh_whatever_the_login_shell(
+        self, ssh_manager, tmp_path, monkeypatch
+    ):
+        """Should wrap the POSIX script in sh -c for fish/csh login shells."""
+        _result, client, _authorized_keys = self._upload(
+            ssh_manager, tmp_path, monkeypatch
+        )
+        command = client.exec_command.call_args.args[0]
+        argv = shlex.split(command)
+        assert argv[:2] == ["sh", "-c"] and len(argv) == 3
+        assert argv[2].startswith("key=")
+
+    def test_upload_reports_unverified_when_key_still_rejected(
+        self, ssh_manager, tmp_path, monkeypatch
+    ):
+        """Should leave verification to the caller if the new key is refused."""
+        check_client = MagicMock()
+        check_client.connect.side_effect = paramiko.AuthenticationException
+        result, _client, _authorized_keys = self._upload(
+            ssh_manager, tmp_path, monkeypatch, check_client=check_client
+        )
+        assert result == (True, False)
+        assert check_client.connect.call_args.kwargs["pkey"] is not None
+        check_client.close.assert_called_once()
+
+
+class TestPrivateKeyCache:
+    """Test reuse of the parsed private key."""
+
+    def test_reparses_only_when_key_file_changes(self, ssh_manager, monkeypatch):
+        """Should parse once per key file version."""
+        loads = []
+        monkeypatch.setattr(
+            paramiko.PKey,
+            "from_path",
+            lambda path: loads.append(path) or Mock(),
+        )
+        ssh_manager.private_key_path.write_bytes(b"private key")
+
+        first = ssh_manager._load_private_key()
+        assert ssh_manager._load_private_key() is first
+        assert len(loads) == 1
+
+        os.utime(ssh_manager.private_key_path, ns=(0, 0))
+        assert ssh_manager._load_private_key() is not first
+        assert len(loads) == 2
+
+
+class TestGenerateSSHKey:
+    """Test key pair generation per configured key type."""
+
+    def test_generates_ed25519_by_default(self, ssh_manager):
+        """Should write an OpenSSH Ed25519 key that loads back."""
+        assert ssh_manager.generate_ssh_key() is True
+        public_key = ssh_manager.public_key_path.read_text()
+        assert public_key.startswith("ssh-ed25519 ")
+        assert stat.S_IMODE(ssh_manager.private_key_path.stat().st_mode) == 0o600
+
+        ssh_manager._key_cache = None
+        key = ssh_manager._load_private_key()
+        assert isinstance(key, paramiko.Ed25519Key)
+        assert public_key.split()[1] == key.get_base64()
+
+    def test_private_key_is_never_world_readable(self, ssh_manager, monkeypatch):
+        """Should create the key 0600 even when the later chmod fails."""
+        monkeypatch.setattr(ssh_module.os, "chmod", Mock(side_effect=OSError))
+        old_umask = os.umask(0o022)
+        try:
+            assert ssh_manager.generate_ssh_key() is True
+        finally:
+            os.umask(old_umask)
+        assert stat.S_IMODE(ssh_manager.private_key_path.stat().st_mode) == 0o600
+
+    def test_regenerates_public_key_for_existing_rsa_key(self, ssh_manager):
+        """Should keep supporting RSA keys created by earlier versions."""
+        paramiko.RSAKey.generate(1024).write_private_key_file(
+            str(ssh_manager.private_key_path)
+        )
+        assert ssh_manager.generate_ssh_key() is False
+        assert ssh_manager.public_key_path.read_text().startswith("ssh-rsa ")
+
+
+class TestConnect:
+    """Test how connect() hands the terminal over to ssh."""
+
+    def test_replaces_process_by_default(self, ssh_manager, monkeypatch):
+        """Should exec ssh instead of waiting on a child process."""
+        calls = []
+        monkeypatch.setattr(ssh_module.os, "name", "posix")
+        monkeypatch.setattr(ssh_module.os, "execvp", lambda *a: calls.append(a))
+        monkeypatch.setattr(ssh_module.subprocess, "run", Mock())
+        ssh_manager.connect(TUNNEL, [8888])
+        assert calls[0][0] == "ssh"
+        assert calls[0][1][-2:] == ["-L", "8888:localhost:8888"]
+
+    def test_returns_exit_code_without_replacing(self, ssh_manager, monkeypatch):
+        """Should run ssh as a child and report its exit code."""
+        monkeypatch.setattr(ssh_module.os, "execvp", Mock(side_effect=AssertionError))
+        monkeypatch.setattr(
+            ssh_module.subprocess, "run", Mock(return_value=Mock(returncode=255))
+        )
+        assert ssh_manager.connect(replace_process=False) == 255
+        ssh_module.subprocess.run.assert_called_once_with(["ssh", "cpolar-server"])
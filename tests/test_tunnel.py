@@ -2,11 +2,25 @@
 Tests for tunnel.py - Tunnel URL parsing and extraction.
 """
 
+import logging
 import pytest
+from pathlib import Path
+from unittest.mock import MagicMock, Mock
 from cpolar_connect.tunnel import TunnelManager, TunnelInfo
 from cpolar_connect.exceptions import TunnelError
 
 
+def _page(url, html):
+    """Response mock usable both streamed and fully read."""
+    response = MagicMock(url=url, text=html, content=html.encode("utf-8"))
+    response.__enter__.return_value = response
+    response.encoding = "utf-8"
+    response.status_code = 200
+    response.headers = {}
+    response.iter_content.side_effect = lambda chunk_size=1: iter([response.content])
+    return response
+
+
 class TestTunnelUrlParsing:
     """Test tunnel URL parsing from HTML."""
 
@@ -32,6 +46,19 @@ class TestTunnelUrlParsing:
         assert url.startswith("tcp://")
         assert "4cbb1683.r35.cpolar.top" not in url
 
+    def test_ssh_tunnel_after_tcp_tunnel_is_preferred(self):
+        """Should prefer a later SSH row over an earlier plain TCP row."""
+        manager = TunnelManager.__new__(TunnelManager)
+        html = """
+        <table>
+         <tr><td>rdp</td><th>tcp://1.tcp.cpolar.top:1111</th>
+             <td>cn</td><td>tcp://127.0.0.1:3389</td><td>-</td></tr>
+         <tr><td><b>ssh</b></td><th>tcp://2.tcp.cpolar.top:2222</th>
+             <td>cn</td><td>tcp://127.0.0.1:22</td><td>-</td></tr>
+        </table>
+        """
+        assert manager._parse_tunnel_url(html) == "tcp://2.tcp.cpolar.top:2222"
+
     def test_fallback_to_non_ssh_tcp_tunnel(self, sample_status_html_only_remote_desktop):
         """Should fallback to any TCP tunnel if no SSH tunnel found."""
         manager = TunnelManager.__new__(TunnelManager)
@@ -58,6 +85,63 @@ class TestTunnelUrlParsing:
         with pytest.raises(TunnelError):
             manager._parse_tunnel_url(html)
 
+    def test_ssh_row_found_without_parsing(self, sample_status_html, monkeypatch):
+        """Should find the SSH row by scanning, without running the HTML parser."""
+        from lxml import etree
+
+        monkeypatch.setattr(etree, "HTMLParser", Mock(side_effect=AssertionError))
+        manager = TunnelManager.__new__(TunnelManager)
+        assert manager._parse_tunnel_url(sample_status_html) == (
+            "tcp://7.tcp.vip.cpolar.cn:12766"
+        )
+
+    def test_unusual_row_markup_falls_back_to_parser(self, sample_status_html):
+        """Should still find the SSH row when its markup defeats the row scan."""
+        manager = TunnelManager.__new__(TunnelManager)
+        html = sample_status_html.replace("<td>default</td>", "<td><b>default</b></td>")
+        assert manager._parse_tunnel_url(html) == "tcp://7.tcp.vip.cpolar.cn:12766"
+
+    def test_tcp_fallback_found_without_parsing(self, sample_status_html_only_remote_desktop, monkeypatch):
+        """Should take the TCP fallback from the row scan when every row matched."""
+        from lxml import etree
+
+        monkeypatch.setattr(etree, "HTMLParser", Mock(side_effect=AssertionError))
+        manager = TunnelManager.__new__(TunnelManager)
+        url = manager._parse_tunnel_url(sample_status_html_only_remote_desktop, skip_tunnels=[])
+        assert url == "tcp://35.tcp.cpolar.top:12211"
+
+    def test_unrecognized_row_defers_fallback_to_parser(self, sample_status_html_only_remote_desktop):
+        """Should not settle for a TCP fallback while an SSH row went unmatched."""
+        manager = TunnelManager.__new__(TunnelManager)
+        html = sample_status_html_only_remote_desktop.replace(" </tbody>", """  <tr>
+   <td><b>ssh</b></td><th>tcp://2.tcp.cpolar.top:2222</th>
+   <td>cn</td><td>tcp://127.0.0.1:22</td><td>-</td>
+  </tr>
+ </tbody>""")
+        assert manager._parse_tunnel_url(html, skip_tunnels=[]) == "tcp://2.tcp.cpolar.top:2222"
+
+    def test_skipped_ssh_tunnel_is_passed_over(self, sample_status_html):
+        """Should pick the next SSH row when an earlier one is in the skip list."""
+        manager = TunnelManager.__new__(TunnelManager)
+        html = sample_status_html.replace("tcp://127.0.0.1:3389", "tcp://127.0.0.1:22")
+        url = manager._parse_tunnel_url(html, skip_tunnels=["default"])
+        assert url == "tcp://35.tcp.cpolar.top:12211"
+
+    def test_skip_list_set_at_construction(self, sample_status_html):
+        """Should use the manager's skip set when none is passed per call."""
+        assert TunnelManager.skip_tunnels == frozenset({"remoteDesktop"})
+        manager = TunnelManager(Mock(), skip_tunnels=["default"])
+        assert manager.skip_tunnels == frozenset({"default"})
+        html = sample_status_html.replace("tcp://127.0.0.1:3389", "tcp://127.0.0.1:22")
+        assert manager._parse_tunnel_url(html) == "tcp://35.tcp.cpolar.top:12211"
+
+    def test_empty_page_raises_error(self, monkeypatch, tmp_path):
+        """Should raise TunnelError for an empty response body."""
+        monkeypatch.setattr(Path, "home", lambda: tmp_path)
+        manager = TunnelManager.__new__(TunnelManager)
+        with pytest.raises(TunnelError):
+            manager._parse_tunnel_url("")
+
 
 class TestHostnamePortExtraction:
     """Test hostname and port extraction from tunnel URL."""
@@ -112,6 +196,13 @@ class TestTunnelInfo:
         assert info.name == "ssh"
         assert info.active is True
 
+    def test_tunnel_info_has_no_instance_dict(self):
+        """Should keep attributes in slots, rejecting unknown ones."""
+        info = TunnelInfo(url="tcp://example.com:1234", hostname="example.com", port=1234)
+        assert not hasattr(info, "__dict__")
+        with pytest.raises(AttributeError):
+            info.region = "cn"
+
     def test_tunnel_info_to_dict(self):
         """Should convert TunnelInfo to dictionary."""
         info = TunnelInfo(
@@ -139,3 +230,152 @@ class TestTunnelInfo:
         assert "ssh" in s
         assert "example.com" in s
         assert "1234" in s
+
+
+class TestAuthToken:
+    """Test auth token extraction from the auth page."""
+
+    def _manager_with_page(self, html):
+        manager = TunnelManager.__new__(TunnelManager)
+        manager.auth_url = "https://dashboard.cpolar.com/auth"
+        manager.session = Mock()
+        manager.session.get.return_value = Mock(content=html.encode("utf-8"))
+        return manager
+
+    def test_get_auth_token_from_input(self):
+        """Should read the token from the #authtoken input."""
+        html = '<html><body><input id="authtoken" value=" abc123 "/></body></html>'
+        assert self._manager_with_page(html).get_auth_token() == "abc123"
+
+    def test_get_auth_token_from_code_block(self):
+        """Should fall back to an authtoken line inside a code block."""
+        html = "<html><body><pre>authtoken: tok_456</pre></body></html>"
+        assert self._manager_with_page(html).get_auth_token() == "tok_456"
+
+    def test_get_auth_token_from_nested_code_markup(self):
+        """Should read a token split across markup inside a code block."""
+        html = (
+            "<html><body><code>run ./cpolar</code>"
+            "<pre><span>authtoken:</span> <b>tok_789</b></pre></body></html>"
+        )
+        assert self._manager_with_page(html).get_auth_token() == "tok_789"
+
+    def test_get_auth_token_missing(self):
+        """Should return None when no token is on the page."""
+        html = "<html><body><p>nothing</p></body></html>"
+        assert self._manager_with_page(html).get_auth_token() is None
+
+
+class TestTunnelInfoCache:
+    """Test the short-lived cache of the parsed status page."""
+
+    @staticmethod
+    def _manager(sample_status_html):
+        session = Mock()
+        session.get.side_effect = lambda url, **kwargs: _page(url, sample_status_html)
+        return TunnelManager(session)
+
+    def test_repeated_lookups_share_one_fetch(self, sample_status_html):
+        """Should serve calls within the TTL from the cache."""
+        manager = self._manager(sample_status_html)
+        info = manager.get_tunnel_info()
+        assert manager.get_all_tunnels() == {"ssh": info}
+        assert manager.verify_tunnel_active(info) is True
+        assert manager.session.get.call_count == 1
+
+    def test_expired_or_invalidated_cache_refetches(self, sample_status_html):
+        """Should fetch again after the TTL or an explicit invalidation."""
+        manager = self._manager(sample_status_html)
+        manager.get_tunnel_info()
+        manager.invalidate_cache()
+        manager.get_tunnel_info()
+        manager.cache_ttl = 0
+        manager.get_tunnel_info()
+        assert manager.session.get.call_count == 3
+
+
+class TestFetchStatusPage:
+    """Test the bounded read of the status page."""
+
+    def test_oversized_page_is_truncated(self, monkeypatch):
+        """Should stop reading once the size cap is reached."""
+        from cpolar_connect import tunnel as tunnel_module
+
+        monkeypatch.setattr(tunnel_module, "_MAX_STATUS_BYTES", 9)
+        session = Mock()
+        session.get.return_value = _page(
+            "https://dashboard.cpolar.com/status", "<p>隧道</p>" * 100
+        )
+        manager = TunnelManager(session)
+        assert manager._fetch_status_page() == "<p>隧道".encode("utf-8")
+        session.get.assert_called_once_with(
+            "https://dashboard.cpolar.com/status", timeout=10, stream=True, headers={}
+        )
+
+    def test_login_redirect_means_session_expired(self):
+        """Should raise TunnelError when the status page redirects to login."""
+        session = Mock()
+        session.get.return_value = _page("https://dashboard.cpolar.com/login", "")
+        with pytest.raises(TunnelError):
+            TunnelManager(session)._fetch_status_page()
+
+    def test_raw_page_is_parsed_without_decoding(self, sample_status_html):
+        """Should read non-ASCII tunnel names from the undecoded page."""
+        manager = TunnelManager.__new__(TunnelManager)
+        raw = sample_status_html.replace("default", "我的隧道").encode("utf-8")
+        assert manager._parse_tunnel_url(raw, skip_tunnels=["我的隧道"]) == (
+            "tcp://35.tcp.cpolar.top:12211"
+        )
+        # The same page through the parser target
+        raw = raw.replace(b"<td>remoteDesktop</td>", b"<td><b>remoteDesktop</b></td>")
+        assert manager._parse_tunnel_url(raw, skip_tunnels=["我的隧道"]) == (
+            "tcp://35.tcp.cpolar.top:12211"
+        )
+
+    def test_not_modified_page_reuses_previous_body(self, sample_status_html):
+        """Should revalidate with the ETag and reuse the body on 304."""
+        first = _page("https://dashboard.cpolar.com/status", sample_status_html)
+        first.headers = {"ETag": '"v1"'}
+        not_modified = _page("https://dashboard.cpolar.com/status", "")
+        not_modified.status_code = 304
+        session = Mock()
+        session.get.side_effect = [first, not_modified]
+        manager = TunnelManager(session)
+
+        info = manager.get_tunnel_info()
+        manager.invalidate_cache()
+        assert manager.verify_tunnel_active(info) is True
+        assert session.get.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+        not_modified.iter_content.assert_not_called()
+
+
+class TestStatusPageDump:
+    """Test saving unparseable status pages for debugging."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_home(self, monkeypatch, tmp_path):
+        from cpolar_connect import tunnel as tunnel_module
+
+        monkeypatch.setattr(Path, "home", lambda: tmp_path)
+        monkeypatch.setattr(tunnel_module, "_last_debug_dump", None)
+        self.log_dir = tmp_path / ".cpolar_connect" / "logs"
+
+    def _fail_parse(self):
+        manager = TunnelManager.__new__(TunnelManager)
+        with pytest.raises(TunnelError):
+            manager._parse_tunnel_url("<p>maintenance</p>")
+
+    def test_no_dump_without_debug_logging(self, caplog):
+        """Should not touch the disk at the default log level."""
+        caplog.set_level(logging.INFO, logger="cpolar_connect.tunnel")
+        self._fail_parse()
+        assert not self.log_dir.exists()
+
+    def test_debug_dump_is_rate_limited(self, caplog):
+        """Should write one dump for back-to-back failures."""
+        caplog.set_level(logging.DEBUG, logger="cpolar_connect.tunnel")
+        self._fail_parse()
+        self._fail_parse()
+        dumps = list(self.log_dir.glob("tunnel_status_debug_*.html"))
+        assert len(dumps) == 1
+        assert dumps[0].read_text(encoding="utf-8") == "<p>maintenance</p>"
@@ -0,0 +1,73 @@
+"""
+Tests for cli._verify_cpolar_credentials - login result detection.
+"""
+
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from cpolar_connect import cli as cli_module
+
+LOGIN_URL = "https://dashboard.cpolar.com/login"
+
+
+def _response(url, chunks=(), location=None):
+    """Streamed response mock usable as a context manager."""
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.url = url
+    response.is_redirect = location is not None
+    response.headers = {"Location": location} if location else {}
+    response.encoding = "utf-8"
+    response.iter_content.return_value = iter(list(chunks))
+    return response
+
+
+@pytest.fixture
+def login_session(monkeypatch):
+    """Install a session whose login POST returns the given response."""
+
+    def factory(post_response, landing=None):
+        session = MagicMock()
+        login_page = Mock(content=b'<input name="csrf_token" value="token_123">')
+        session.get.side_effect = [login_page] + ([landing] if landing else [])
+        session.post.return_value = post_response
+        monkeypatch.setattr(cli_module, "_get_verify_session", lambda: session)
+        return session
+
+    return factory
+
+
+class TestVerifyCredentials:
+    """Test credential verification against streamed login responses."""
+
+    def test_redirect_to_status_is_not_followed(self, login_session):
+        """Should succeed from the redirect target without fetching it."""
+        response = _response(LOGIN_URL, location="/status")
+        session = login_session(response)
+        assert cli_module._verify_cpolar_credentials("u", "p") is True
+        assert session.get.call_count == 1
+        response.iter_content.assert_not_called()
+
+    def test_redirect_back_to_login_fails(self, login_session):
+        """Should fail when the POST redirects back to the login page."""
+        login_session(_response(LOGIN_URL, location=LOGIN_URL))
+        assert cli_module._verify_cpolar_credentials("u", "p") is False
+
+    def test_inconclusive_redirect_scans_landing_page(self, login_session):
+        """Should follow an unknown redirect and scan the page it lands on."""
+        landing = _response("https://dashboard.cpolar.com/", ["<a>隧道列表</a>"])
+        session = login_session(_response(LOGIN_URL, location="/"), landing)
+        assert cli_module._verify_cpolar_credentials("u", "p") is True
+        session.get.assert_called_with(
+            "https://dashboard.cpolar.com/", timeout=10, stream=True
+        )
+
+    def test_failure_phrase_split_across_chunks(self, login_session):
+        """Should match a failure phrase straddling a chunk boundary."""
+        landing = _response(
+            "https://dashboard.cpolar.com/",
+            ["<p>Logout</p><p>The password is not ", "VALID.</p>"],
+        )
+        login_session(_response(LOGIN_URL, location="/"), landing)
+        assert cli_module._verify_cpolar_credentials("u", "p") is False